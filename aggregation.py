@@ -0,0 +1,173 @@
+import pandas as pd
+
+# ==========================================
+# 加权汇总引擎
+# 先一次性算出 "指标 × 课时数" 乘积列，再用一次 groupby().sum()
+# 得到 (周, 年级, 班级, 学科) 最细粒度汇总，(周) 与 (年级, 班级) 两级
+# 结果都从这张小表上再汇总得到，替代逐组调用 weighted_avg
+# ==========================================
+
+GRADE_COL = '年级'
+HOURS_NAME = '课时数'
+SUBJECT_NAME = '主要学科'
+
+# cols_map 键 -> 报表中的指标名 (按课时数加权)
+WEIGHTED_METRICS = {
+    'att': '出勤率',
+    'micro': '微课完成率',
+    'corr': '题目正确率',
+}
+
+# 最细粒度汇总表 (partial) 的索引层级与求和列，与上传文件的表头无关
+WEEK_LEVEL = '_week'
+CLASS_LEVEL = '_class'
+SUBJECT_LEVEL = '_subject'
+ROLLUP_LEVELS = [WEEK_LEVEL, GRADE_COL, CLASS_LEVEL, SUBJECT_LEVEL]
+HOURS_SUM = '_hours'
+NO_SUBJECT = '-'
+# 多校合并上传时，partial 最外层多一级来源 (学校)
+SOURCE_LEVEL = '_source'
+SCHOOL_COL = '学校'
+
+
+def product_col(key):
+    return f'_p_{key}'
+
+
+SUM_COLUMNS = [HOURS_SUM] + [product_col(k) for k in WEIGHTED_METRICS]
+
+
+def build_weighted_frame(df, cols_map, grades, week_key=None):
+    """
+    只保留汇总所需的列，并预先计算加权乘积列：
+    _week / 年级 / _class / _subject / _hours / _p_att / _p_micro / _p_corr
+    """
+    if week_key is None:
+        week_key = df[cols_map['time']].astype(str)
+    hours = pd.to_numeric(df[cols_map['hours']], errors='coerce').fillna(0)
+    # 紧凑存储的课时数 (int8/float32 等) 求和前升回 64 位，避免溢出和精度损失
+    hours = hours.astype('int64' if hours.dtype.kind in 'iu' else 'float64')
+    if 'subject' in cols_map:
+        subjects = df[cols_map['subject']].astype(str)
+    else:
+        subjects = NO_SUBJECT
+
+    work = pd.DataFrame({
+        WEEK_LEVEL: week_key,
+        GRADE_COL: grades,
+        CLASS_LEVEL: df[cols_map['class']],
+        SUBJECT_LEVEL: subjects,
+        HOURS_SUM: hours,
+    }, index=df.index)
+    for key in WEIGHTED_METRICS:
+        if key in cols_map:
+            work[product_col(key)] = df[cols_map[key]] * hours
+        else:
+            work[product_col(key)] = 0.0
+    return work
+
+
+def finish_weighted(sums):
+    """由课时数与加权乘积之和得到加权平均；课时数为 0 的分组记为 0 (与 weighted_avg 一致)"""
+    hours = sums[HOURS_SUM]
+    safe_hours = hours.where(hours != 0)
+    out = pd.DataFrame(index=sums.index)
+    out[HOURS_NAME] = hours.astype(int)
+    for key, name in WEIGHTED_METRICS.items():
+        out[name] = (sums[product_col(key)] / safe_hours).fillna(0.0)
+    return out
+
+
+def partial_rollup(df, cols_map, grades, week_key=None, sources=None):
+    """
+    对一块数据做最细粒度 (周, 年级, 班级, 学科) 汇总：课时数与加权乘积之和。
+    分组保持首次出现顺序 (主要学科列表依赖这一顺序)。
+    分块读取时每块各算一次，再用 merge_partials 合并。
+    sources 为每行的来源 (学校) 时，索引最外层多一级 SOURCE_LEVEL；
+    其余汇总函数都按层级名取值，多出的这一级不影响结果。
+    """
+    work = build_weighted_frame(df, cols_map, grades, week_key)
+    levels = ROLLUP_LEVELS
+    if sources is not None:
+        work.insert(0, SOURCE_LEVEL, sources)
+        levels = [SOURCE_LEVEL] + ROLLUP_LEVELS
+    partial = work.groupby(levels, sort=False, observed=True)[SUM_COLUMNS].sum()
+    return _plain_levels(partial)
+
+
+def _plain_levels(partial):
+    """category 分组键得到的索引层级转回普通取值，便于合并与入库"""
+    index = partial.index
+    if any(isinstance(level.dtype, pd.CategoricalDtype) for level in index.levels):
+        partial.index = index.set_levels([
+            level.astype(level.categories.dtype) if isinstance(level.dtype, pd.CategoricalDtype) else level
+            for level in index.levels
+        ])
+    return partial
+
+
+def merge_partials(parts):
+    """合并多块 partial_rollup 的结果"""
+    sums = pd.concat(list(parts))
+    return sums.groupby(level=list(sums.index.names), sort=False).sum()
+
+
+def rollup_weeks(partial):
+    """汇总结果中出现过的周次 (字符串)"""
+    return list(partial.index.get_level_values(WEEK_LEVEL).unique())
+
+
+def weekly_sums(partial):
+    """按周汇总课时数与加权乘积 (趋势图和周环比都只需要这张小表)"""
+    return partial.groupby(level=WEEK_LEVEL, sort=False)[SUM_COLUMNS].sum()
+
+
+def finalize_rollups(partial, cols_map, target_week, week_sums=None):
+    """
+    由最细粒度汇总得到：
+    - hist_stats: 每周汇总 (全周期历史趋势)；传入 week_sums 时直接使用 (如来自历史库)
+    - class_stats: 目标周按 (年级, 班级) 汇总，含主要学科列表
+    返回 (hist_stats, class_stats)，列与原 groupby.apply 版本一致。
+    """
+    time_col = cols_map['time']
+    class_col = cols_map['class']
+
+    if week_sums is None:
+        week_sums = weekly_sums(partial)
+    hist_stats = finish_weighted(week_sums)[[HOURS_NAME, '出勤率', '题目正确率']]
+    hist_stats = hist_stats.rename_axis(time_col).reset_index()
+
+    in_week = partial.xs(target_week, level=WEEK_LEVEL)
+    class_sums = in_week.groupby(level=[GRADE_COL, CLASS_LEVEL]).sum()
+    class_stats = finish_weighted(class_sums)
+    class_stats = class_stats[[HOURS_NAME, '出勤率', '微课完成率', '题目正确率']]
+    subject_pairs = in_week.index.to_frame(index=False)
+    subject_lists = subject_pairs.groupby([GRADE_COL, CLASS_LEVEL], sort=False)[SUBJECT_LEVEL].agg(','.join)
+    class_stats[SUBJECT_NAME] = subject_lists.reindex(class_stats.index)
+    class_stats = class_stats.reset_index().rename(columns={CLASS_LEVEL: class_col})
+
+    return hist_stats, class_stats
+
+
+def school_rollups(partial, time_col):
+    """多校数据按 (学校, 周) 汇总：学校 / 周次 / 课时数 / 出勤率 / 题目正确率；单校数据返回 None"""
+    if SOURCE_LEVEL not in partial.index.names:
+        return None
+    sums = partial.groupby(level=[SOURCE_LEVEL, WEEK_LEVEL], sort=False)[SUM_COLUMNS].sum()
+    stats = finish_weighted(sums)[[HOURS_NAME, '出勤率', '题目正确率']]
+    return stats.rename_axis([SCHOOL_COL, time_col]).reset_index()
+
+
+def week_metrics(hist_stats, time_col, week):
+    """从周汇总中取出某一周的核心指标 (总课时 / 出勤率 / 正确率)"""
+    if week is None:
+        return None
+    row = hist_stats[hist_stats[time_col] == week]
+    if row.empty:
+        return None
+    row = row.iloc[0]
+    return {
+        'hours': int(row[HOURS_NAME]),
+        'att': float(row['出勤率']),
+        'corr': float(row['题目正确率']),
+    }
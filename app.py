@@ -1,11 +1,25 @@
 import streamlit as st
-import pandas as pd
 import os
-import re
 import json
 import datetime
+import time
+import uuid
 import streamlit.components.v1 as components
 
+from aggregation import NO_SUBJECT
+from cleaning import natural_sort_key
+from cube import RollupCube
+from event_log import get_logger
+from excel_reader import list_sheets
+from history_store import HISTORY_DB, HistoryStore
+from ingest import is_csv
+from jobs import JobManager
+from log_index import LogIndex
+from metrics import METRICS_FILE, MetricsStore, RunProfile, runs_of_kind, slowest_runs, stage_percentiles
+from report_cache import ReportCache, hash_bytes, make_key
+from report_pipeline import (ReportDataError, read_and_rollup, read_and_rollup_many, report_from_rollup,
+                             report_output_path)
+
 # ==========================================
 # 0. 全局配置与文件路径
 # ==========================================
@@ -18,6 +32,13 @@ st.set_page_config(
 LOG_FILE = "access_log.csv"
 FEEDBACK_FILE = "feedback_log.csv"
 CONFIG_FILE = "config.json"
+LOG_COLUMNS = ["访问时间", "事件"]
+FEEDBACK_COLUMNS = ["时间", "评价", "建议"]
+REPORT_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 报表缓存上限 256MB (所有会话共享)
+LOG_PAGE_SIZE = 50
+LOG_DEFAULT_DAYS = 30  # 日志默认显示最近 30 天
+REPORT_WORKERS = 2      # 后台生成报表的线程数 (所有会话共享)
+JOB_POLL_SECONDS = 0.5  # 进度刷新间隔
 
 # ==========================================
 # 1. 核心工具函数 (密码管理、日志记录)
@@ -39,25 +60,46 @@ def save_config(config):
     with open(CONFIG_FILE, 'w') as f:
         json.dump(config, f)
 
+def access_logger():
+    return get_logger(LOG_FILE, LOG_COLUMNS)
+
+def feedback_logger():
+    return get_logger(FEEDBACK_FILE, FEEDBACK_COLUMNS)
+
 def log_access(event_type="用户登录"):
-    """记录访问日志"""
+    """记录访问日志 (入队后由后台线程批量写盘)"""
     now_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    if not os.path.exists(LOG_FILE):
-        df_log = pd.DataFrame(columns=["访问时间", "事件"])
-        df_log.to_csv(LOG_FILE, index=False)
-    
-    new_entry = pd.DataFrame([{"访问时间": now_time, "事件": event_type}])
-    new_entry.to_csv(LOG_FILE, mode='a', header=False, index=False)
+    access_logger().log([now_time, event_type])
 
 def save_feedback(rating, comment):
     """保存用户评价和建议"""
     now_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    if not os.path.exists(FEEDBACK_FILE):
-        df = pd.DataFrame(columns=["时间", "评价", "建议"])
-        df.to_csv(FEEDBACK_FILE, index=False)
-    
-    new_entry = pd.DataFrame([{"时间": now_time, "评价": rating, "建议": comment}])
-    new_entry.to_csv(FEEDBACK_FILE, mode='a', header=False, index=False)
+    feedback_logger().log([now_time, rating, comment])
+
+@st.cache_resource
+def get_metrics_store():
+    """全局共享的运行耗时记录"""
+    return MetricsStore(METRICS_FILE)
+
+@st.cache_resource
+def get_log_index(path):
+    """全局共享的日志索引，每次查看只增量读取新追加的日志"""
+    return LogIndex(path)
+
+@st.cache_resource
+def get_report_cache():
+    """全局共享的报表缓存 (跨会话、跨重跑)"""
+    return ReportCache(max_bytes=REPORT_CACHE_MAX_BYTES)
+
+@st.cache_resource
+def get_history_store():
+    """全局共享的历史库连接"""
+    return HistoryStore(HISTORY_DB)
+
+@st.cache_resource
+def get_job_manager():
+    """全局共享的后台报表任务池，同一份上传只计算一次"""
+    return JobManager(max_workers=REPORT_WORKERS)
 
 # ==========================================
 # 2. 权限控制逻辑 (隐形管理员入口)
@@ -102,25 +144,87 @@ if auth_status == 2:
     st.sidebar.success("🔑 管理员已登录")
     st.title("🔧 管理员控制台")
     
-    tab1, tab2, tab3 = st.tabs(["📝 访问日志", "💬 用户反馈", "⚙️ 系统设置"])
+    tab1, tab_perf, tab2, tab3 = st.tabs(["📝 访问日志", "⏱️ 性能监控", "💬 用户反馈", "⚙️ 系统设置"])
     
+    def show_log(logger, key, empty_text, download_label, download_name, usage_chart=False):
+        """按时间范围分页查看日志，下载所选范围的原始记录"""
+        logger.flush()
+        index = get_log_index(logger.path)
+        index.refresh()
+        days = index.days()
+        if not days:
+            st.info(empty_text)
+            return
+        first_day = datetime.date.fromisoformat(days[0])
+        last_day = datetime.date.fromisoformat(days[-1])
+        default_start = max(first_day, last_day - datetime.timedelta(days=LOG_DEFAULT_DAYS - 1))
+        picked = st.date_input("时间范围", value=(default_start, last_day),
+                               min_value=first_day, max_value=last_day, key=f"{key}_range")
+        if not isinstance(picked, (tuple, list)):
+            picked = (picked,)
+        if not picked:
+            picked = (default_start, last_day)
+        start, end = picked[0], picked[-1]
+
+        total = index.count(start, end)
+        if usage_chart:
+            c1, c2 = st.columns(2)
+            with c1:
+                st.caption("每日访问次数")
+                st.bar_chart(index.daily_counts(start, end))
+            with c2:
+                st.caption("各时段访问次数")
+                st.bar_chart(index.hourly_counts(start, end))
+
+        pages = max(1, -(-total // LOG_PAGE_SIZE))
+        page = st.number_input("页码", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page")
+        st.caption(f"共 {total} 条，第 {page} / {pages} 页 (按时间倒序)")
+        st.dataframe(index.page(start, end, page - 1, LOG_PAGE_SIZE), use_container_width=True)
+        # 下载内容只在点击 "准备下载" 后生成一次，翻页、改日期等重跑不再读取整个时间范围
+        ready_key = f"{key}_download"
+        prepared = st.session_state.get(ready_key)
+        if prepared is not None and prepared[0] != (start, end, total):
+            del st.session_state[ready_key]  # 范围或记录数变了，已准备的内容作废
+            prepared = None
+        if prepared is None:
+            if st.button("📦 准备下载", key=f"{key}_prepare", help="打包所选时间范围内的全部记录"):
+                prepared = ((start, end, total), b"".join(index.iter_bytes(start, end)))
+                st.session_state[ready_key] = prepared
+        if prepared is not None:
+            st.download_button(download_label, prepared[1], download_name, mime="text/csv",
+                               on_click=lambda: st.session_state.pop(ready_key, None))
+
     with tab1:
         st.subheader("访问日志记录")
-        if os.path.exists(LOG_FILE):
-            df_log = pd.read_csv(LOG_FILE).sort_values(by="访问时间", ascending=False)
-            st.dataframe(df_log, use_container_width=True)
-            st.download_button("📥 下载日志", df_log.to_csv(index=False).encode('utf-8-sig'), "access_log.csv")
-        else:
-            st.info("暂无日志")
+        show_log(access_logger(), "access", "暂无日志", "📥 下载日志", "access_log.csv", usage_chart=True)
             
+    with tab_perf:
+        st.subheader("报表生成耗时")
+        all_runs = get_metrics_store().load()
+        runs = runs_of_kind(all_runs, 'upload')  # 切换筛选条件的运行很快，单独统计，不拉低上传的分位数
+        views = runs_of_kind(all_runs, 'view')
+        if runs.empty:
+            st.info("暂无记录")
+        else:
+            p1, p2, p3, p4 = st.columns(4)
+            p1.metric("上传次数", len(runs))
+            p2.metric("总耗时 P50", f"{runs['total_ms'].quantile(0.5) / 1000:.2f} s")
+            p3.metric("总耗时 P90", f"{runs['total_ms'].quantile(0.9) / 1000:.2f} s")
+            if 'frame_mb' in runs.columns and runs['raw_mb'].sum() > 0:
+                p4.metric("数据表内存 (整理后 / 前)", f"{runs['frame_mb'].sum() / runs['raw_mb'].sum() * 100:.0f}%")
+            st.caption("各阶段耗时分位数 (峰值内存为阶段内进程内存的增量)")
+            st.dataframe(stage_percentiles(runs), use_container_width=True)
+            st.caption("最近运行的总耗时 (ms)")
+            st.line_chart(runs['total_ms'].tail(200).reset_index(drop=True))
+            st.caption("最慢的 10 次运行")
+            st.dataframe(slowest_runs(runs, 10), use_container_width=True)
+        if not views.empty:
+            st.caption(f"切换筛选条件 (只汇总与渲染)：{len(views)} 次，"
+                       f"P50 {views['total_ms'].quantile(0.5):.0f} ms，P90 {views['total_ms'].quantile(0.9):.0f} ms")
+
     with tab2:
         st.subheader("用户评价与建议")
-        if os.path.exists(FEEDBACK_FILE):
-            df_feed = pd.read_csv(FEEDBACK_FILE).sort_values(by="时间", ascending=False)
-            st.dataframe(df_feed, use_container_width=True)
-            st.download_button("📥 下载反馈", df_feed.to_csv(index=False).encode('utf-8-sig'), "feedback.csv")
-        else:
-            st.info("暂无反馈")
+        show_log(feedback_logger(), "feedback", "暂无反馈", "📥 下载反馈", "feedback.csv")
             
     with tab3:
         st.subheader("修改密码")
@@ -135,6 +239,21 @@ if auth_status == 2:
             config["admin_password"] = new_admin_pwd
             save_config(config)
             st.success("密码已更新！请使用新密码重新登录。")
+
+        st.subheader("报表缓存")
+        cache_stats = get_report_cache().stats()
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("缓存条目", cache_stats['entries'])
+        m2.metric("占用 / 上限", f"{cache_stats['bytes']/1024/1024:.1f} / {cache_stats['max_bytes']/1024/1024:.0f} MB")
+        m3.metric("命中 / 未命中", f"{cache_stats['hits']} / {cache_stats['misses']}")
+        m4.metric("命中率", f"{cache_stats['hit_rate']*100:.1f}%")
+        job_stats = get_job_manager().stats()
+        job_labels = {'pending': '排队', 'running': '计算中', 'done': '完成', 'error': '失败', 'cancelled': '已取消'}
+        st.caption("后台任务：" + ("，".join(f"{job_labels[k]} {job_stats[k]}" for k in job_labels if k in job_stats)
+                                   or "暂无"))
+        if st.button("🧹 清空缓存"):
+            get_report_cache().clear()
+            st.success("缓存已清空。")
             
     st.stop() # 管理员界面结束，不显示下面的普通用户功能
 
@@ -145,288 +264,241 @@ st.title("📊 AI课堂教学数据分析工具")
 st.markdown("""
 **使用说明：**
 1. 上传表格 -> 2. 在线预览报表 -> 3. 下载或评价
+
+同时上传多个学校的表格时，会合并生成一份含学校对比的汇总报表 (学校名取自文件名)。
 """)
 
-# --- 辅助函数定义 (保持不变) ---
-def natural_sort_key(s):
-    if not isinstance(s, str): s = str(s)
-    trans_map = {'七': '07', '八': '08', '九': '09', '高一': '10', '高二': '11', '高三': '12'}
-    s_temp = s
-    for k, v in trans_map.items():
-        if k in s_temp and ('级' in s_temp or '年' in s_temp):
-            s_temp = s_temp.replace(k, v)
-    return [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', s_temp)]
-
-def clean_percentage(x):
-    if pd.isna(x) or x == '': return 0.0
-    x_str = str(x).strip()
-    if '%' in x_str:
-        try: return float(x_str.rstrip('%')) / 100
-        except: return 0.0
-    else:
-        try: return float(x_str)
-        except: return 0.0
-
-def get_grade(class_name):
-    class_str = str(class_name)
-    match = re.search(r'(.*?级)', class_str)
-    if match: return match.group(1)
-    if '七' in class_str: return '七年级'
-    if '八' in class_str: return '八年级'
-    if '九' in class_str: return '九年级'
-    return "其他"
-
-def weighted_avg(x, col, w_col='课时数'):
-    try:
-        w_sum = x[w_col].sum()
-        if w_sum == 0: return 0
-        return (x[col] * x[w_col]).sum() / w_sum
-    except ZeroDivisionError: return 0
-
-def get_trend_html(current, previous, is_percent=False):
-    if previous is None or previous == 0: return ""
-    diff = current - previous
-    if abs(diff) < 0.0001: return '<span style="color:#999;font-size:14px;">(持平)</span>'
-    symbol = "↑" if diff > 0 else "↓"
-    color = "#2ecc71" if diff > 0 else "#e74c3c"
-    diff_str = f"{abs(diff)*100:.1f}%" if is_percent else f"{int(abs(diff))}"
-    return f'<span style="color:{color};font-weight:bold;">{symbol} {diff_str}</span>'
+# --- 报表计算 (与界面解耦，便于按内容哈希缓存) ---
+# 报表在后台线程中计算，线程里不能调用 st.* (含 st.cache_resource 函数)，共享资源先在脚本线程中取出
+report_cache, history_store, metrics_store = get_report_cache(), get_history_store(), get_metrics_store()
+
+def upload_hash(files):
+    """上传内容的哈希：单个文件为 内容哈希[:工作表]；多个文件时文件名 (即学校名) 也参与计算"""
+    keys = [hash_bytes(data) + (f":{sheet}" if sheet is not None else "") for _, data, sheet in files]
+    if len(files) == 1:
+        return keys[0]
+    return hash_bytes("\n".join(f"{name}|{key}" for (name, _, _), key in zip(files, keys)).encode('utf-8'))
+
+def load_cube(files, history_scope=None, on_stage=None):
+    """
+    读取上传文件并建立汇总立方体，按 (内容哈希 + 工作表, 列映射) 缓存。
+    files 为 [(文件名, 字节, 工作表)]；多个文件时并行读取并合并为一份多校数据。
+    填写了历史名称时，首次读取会把本次上传按周合并进历史库。
+    返回 {'key', 'partial', 'cube', 'cols_map', 'df', 'merged', 'source', 'profile'}，
+    profile 为本次读取的耗时统计，由随后的 load_report 补全渲染阶段后写入记录。
+    on_stage 见 RunProfile (后台任务的进度与取消)。
+    """
+    cache = report_cache
+    file_hash = upload_hash(files)
+
+    # 命中率只统计立方体与报表的查找；列映射未知时按立方体未命中计一次
+    cols_map = cache.get(('cols_map', file_hash), count=False)
+    bundle = cache.get(make_key(file_hash, cols_map) if cols_map is not None else ('cols_map', None))
+    if bundle is None:
+        source = ('、'.join(name for name, _, _ in files), sum(len(data) for _, data, _ in files))
+        profile = RunProfile(*source, on_stage=on_stage)
+        if len(files) == 1:
+            partial, cols_map, df = read_and_rollup(*files[0], profile)
+        else:
+            partial, cols_map, df = read_and_rollup_many(files, profile)
+        bundle = {'key': make_key(file_hash, cols_map), 'partial': partial, 'cube': RollupCube(partial),
+                  'cols_map': cols_map, 'df': df, 'merged': set(),
+                  'source': source, 'profile': profile}
+        cache.put(('cols_map', file_hash), cols_map)
+        cache.put(bundle['key'], bundle)
+    if history_scope and history_scope not in bundle['merged']:
+        history_store.merge(history_scope, bundle['partial'])
+        bundle['merged'].add(history_scope)
+    return bundle
+
+def load_report(bundle, target_week=None, prev_week=None, grades=None, subjects=None, schools=None,
+                history_scope=None, on_stage=None):
+    """
+    从立方体切片生成报表 (不回扫原始行)，按筛选条件缓存。
+    启用历史库时，趋势与对比周读取历史库中的按周汇总 (按学校筛选时仍用本次上传的数据)。
+    """
+    cache = report_cache
+    grades = tuple(grades or ())
+    subjects = tuple(subjects or ())
+    schools = tuple(schools or ())
+    revision = history_store.revision(history_scope) if history_scope else None
+    key = ('view', bundle['key'], target_week, prev_week, grades, subjects, schools, history_scope, revision)
+    report = cache.get(key)
+    if report is not None:
+        return report
+
+    partial = bundle['cube'].select(grades=grades, subjects=subjects, sources=schools)
+    if partial.empty:
+        raise ReportDataError("所选学校/年级/学科下没有数据。")
+    week_sums = None
+    if history_scope and not schools:
+        week_sums = history_store.week_sums(history_scope, grades, subjects)
+    filter_label = ' / '.join(x for x in ['、'.join(schools), '、'.join(grades), '、'.join(subjects)] if x)
+    # 上传后的首个报表沿用读取阶段的统计，之后切换筛选条件只记录汇总与渲染
+    profile = bundle.pop('profile', None) or RunProfile(*bundle['source'], kind='view')
+    profile.on_stage = on_stage  # 读取阶段可能属于另一个 (已取消的) 任务
+    report = report_from_rollup(partial, bundle['cols_map'], week_sums, target_week, prev_week, filter_label,
+                                profile=profile)
+    metrics_store.record(profile)
+    cache.put(key, report)
+    return report
+
+def default_view(bundle):
+    """select_view 未做任何选择时的筛选参数 (后台任务预先生成这一视图)"""
+    return {'target_week': bundle['cube'].weeks()[-1], 'prev_week': None, 'grades': [], 'subjects': [],
+            'schools': []}
+
+def prepare_report(job, files, history_scope):
+    """
+    后台任务：读取上传并生成默认视图的报表。结果只放在报表缓存中 (受其容量上限与淘汰约束)，
+    任务本身只返回缓存键，页面随后经 load_cube / load_report 命中缓存。
+    """
+    bundle = load_cube(files, history_scope, on_stage=job.enter_stage)
+    load_report(bundle, history_scope=history_scope, on_stage=job.enter_stage, **default_view(bundle))
+    return bundle['key']
+
+def session_id():
+    return st.session_state.setdefault('session_id', uuid.uuid4().hex)
+
+def release_report_job():
+    """放弃本会话正在等待的任务；没有其他会话在等时，任务在下一个阶段开始前取消"""
+    key = st.session_state.pop('report_job', None)
+    if key is not None:
+        get_job_manager().release(key, session_id())
+
+def watch_report_job(files, history_scope):
+    """提交 (或复用) 本次上传的后台任务，按上传哈希去重；换了文件时先放弃上一份上传的任务"""
+    key = ('report', upload_hash(files), history_scope)
+    if st.session_state.get('report_job') != key:
+        release_report_job()
+    st.session_state['report_job'] = key
+    return get_job_manager().submit(key, prepare_report, files, history_scope, watcher=session_id())
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_progress(job):
+    """后台任务进度 (局部定时刷新)，完成后整页重跑以显示报表"""
+    if job.done():
+        st.rerun()
+    elapsed = time.time() - job.started
+    st.progress(job.progress(), text=f"⏳ 正在{job.stage_label()}… (已用时 {elapsed:.0f} 秒)")
+
+@st.fragment
+def feedback_form():
+    """评价与建议 (局部重跑，操作这些控件不会重跑整个页面)"""
+    st.markdown("---")
+    st.subheader("💬 您的反馈")
+
+    col_fb1, col_fb2 = st.columns([1, 2])
+
+    with col_fb1:
+        feedback_score = st.radio("您对本次分析满意吗？", ["👍 棒", "😐 一般", "👎 差"], horizontal=True)
+
+    with col_fb2:
+        feedback_text = st.text_input("有什么改进建议？(可选)")
+
+    if st.button("提交评价"):
+        save_feedback(feedback_score, feedback_text)
+        st.success("感谢您的反馈！我们将持续改进。")
+        st.balloons()
+
+def select_view(bundle, history_scope=None):
+    """统计周 / 对比周 / 年级 / 学科 (多校时另有学校) 选择器，返回 load_report 的筛选参数"""
+    cube = bundle['cube']
+    weeks = cube.weeks()
+    compare_weeks = weeks
+    if history_scope:
+        compare_weeks = sorted(history_store.week_sums(history_scope).index, key=natural_sort_key)
+    subjects = [s for s in cube.subjects() if s != NO_SUBJECT]
+
+    with st.expander("🔍 筛选与对比", expanded=False):
+        c1, c2, c3, c4 = st.columns(4)
+        target_week = c1.selectbox("统计周", weeks, index=len(weeks) - 1)
+        prev_options = ["自动 (上一周)"] + [w for w in compare_weeks if w != target_week]
+        prev_choice = c2.selectbox("对比周", prev_options)
+        grades = c3.multiselect("年级", cube.grades())
+        picked_subjects = c4.multiselect("学科", subjects) if subjects else []
+        schools = st.multiselect("学校", cube.sources()) if cube.sources() else []
+    prev_week = None if prev_choice == prev_options[0] else prev_choice
+    return {'target_week': target_week, 'prev_week': prev_week, 'grades': grades, 'subjects': picked_subjects,
+            'schools': schools}
+
+def select_sheet(file_name, file_bytes, index=None):
+    """
+    多工作表的 Excel 让用户选择要分析的表，只解析选中的那一个。
+    同时上传了多个文件时 index 为该文件的序号 (文件名可能重复，控件键需包含序号)。
+    """
+    if is_csv(file_name):
+        return None
+    cache = report_cache
+    key = ('sheets', hash_bytes(file_bytes))
+    sheets = cache.get(key, count=False)
+    if sheets is None:
+        sheets = list_sheets(file_bytes)
+        cache.put(key, sheets)
+    if len(sheets) <= 1:
+        return None
+    if index is not None:
+        return st.selectbox(f"请选择第 {index + 1} 个文件「{file_name}」要分析的工作表", sheets,
+                            key=f"sheet_{index}_{file_name}")
+    return st.selectbox("请选择要分析的工作表", sheets)
 
 # --- 文件上传与处理 ---
-uploaded_file = st.file_uploader("请上传表格文件", type=['xlsx', 'xls', 'csv'])
+history_scope = st.sidebar.text_input(
+    "📚 历史记录名称 (可选)",
+    help="填写学校/年级等名称后，每次上传会按周合并进历史库，之后每周只需上传新一周的数据。"
+         "同时上传多个文件 (多校汇总) 时不使用历史库。"
+)
+uploaded_files = st.file_uploader("请上传表格文件 (可多选)", type=['xlsx', 'xls', 'csv'], accept_multiple_files=True)
 
-if uploaded_file is not None:
+if uploaded_files:
     try:
-        if uploaded_file.name.endswith('.csv'):
-            try: df = pd.read_csv(uploaded_file, encoding='utf-8')
-            except: df = pd.read_csv(uploaded_file, encoding='gbk')
-        else:
-            df = pd.read_excel(uploaded_file)
-            
-        st.success(f"✅ 成功读取文件：{uploaded_file.name}")
-        
-        # --- 数据处理 ---
-        df = df.fillna(0)
-        cols_map = {}
-        if '周' in df.columns: cols_map['time'] = '周'
-        else: cols_map['time'] = df.columns[0]
-
-        for c in df.columns:
-            if '出勤' in c: cols_map['att'] = c
-            elif '正确' in c: cols_map['corr'] = c
-            elif '微课' in c and '率' in c: cols_map['micro'] = c
-            elif '课时' in c and '数' in c: cols_map['hours'] = c
-            elif '班级' in c: cols_map['class'] = c
-            elif '学科' in c: cols_map['subject'] = c
-        
-        if 'class' not in cols_map: cols_map['class'] = '班级名称'
-        if 'hours' not in cols_map: cols_map['hours'] = '课时数'
-        if 'att' not in cols_map: cols_map['att'] = '课时平均出勤率'
-        if 'corr' not in cols_map: cols_map['corr'] = '题目正确率'
-
-        for k in ['att', 'corr', 'micro']:
-            if k in cols_map and cols_map[k] in df.columns:
-                df[cols_map[k]] = df[cols_map[k]].apply(clean_percentage)
-        
-        time_col = cols_map['time']
-        df = df[df[time_col].astype(str) != '合计']
-        all_periods = [str(x) for x in df[time_col].unique()]
-        try: all_periods.sort(key=lambda x: natural_sort_key(x))
-        except: all_periods.sort()
-        
-        if not all_periods:
-            st.error("数据错误：未找到有效的时间/周次数据。")
+        multi = len(uploaded_files) > 1
+        files = []
+        for i, uploaded_file in enumerate(uploaded_files):
+            file_bytes = uploaded_file.getvalue()
+            sheet = select_sheet(uploaded_file.name, file_bytes, i if multi else None)
+            files.append((uploaded_file.name, file_bytes, sheet))
+        history_scope = history_scope.strip()
+        if multi and history_scope:
+            # 历史库按 (名称, 周) 整周替换且不区分学校，多校数据写入会覆盖其他学校的同周数据
+            st.info("同时上传多个文件时不写入、也不读取历史库，报表只使用本次上传的数据。")
+            history_scope = ''
+        job = watch_report_job(files, history_scope)
+        if not job.done():
+            show_progress(job)
             st.stop()
-
-        target_week = all_periods[-1]
-        prev_week = all_periods[-2] if len(all_periods) > 1 else None
-        
-        df_curr = df[df[time_col].astype(str) == target_week].copy()
-        df_prev = df[df[time_col].astype(str) == prev_week].copy() if prev_week else None
-        df_curr['年级'] = df_curr[cols_map['class']].apply(get_grade)
-        
-        def calc_metrics(d):
-            if d is None or d.empty: return None
-            return {
-                'hours': int(d[cols_map['hours']].sum()),
-                'att': weighted_avg(d, cols_map['att'], cols_map['hours']),
-                'corr': weighted_avg(d, cols_map['corr'], cols_map['hours'])
-            }
-        m_curr = calc_metrics(df_curr)
-        m_prev = calc_metrics(df_prev)
-        
-        t_h = ""; t_a = ""; t_c = ""
-        if m_prev:
-            t_h = get_trend_html(m_curr['hours'], m_prev['hours'], False)
-            t_a = get_trend_html(m_curr['att'], m_prev['att'], True)
-            t_c = get_trend_html(m_curr['corr'], m_prev['corr'], True)
-            
-        class_stats = df_curr.groupby(['年级', cols_map['class']]).apply(
-            lambda x: pd.Series({
-                '课时数': int(x[cols_map['hours']].sum()),
-                '出勤率': weighted_avg(x, cols_map['att'], cols_map['hours']),
-                '微课完成率': weighted_avg(x, cols_map['micro'], cols_map['hours']) if 'micro' in cols_map else 0,
-                '题目正确率': weighted_avg(x, cols_map['corr'], cols_map['hours']),
-                '主要学科': ','.join(x[cols_map['subject']].astype(str).unique()) if 'subject' in cols_map else '-'
-            })
-        ).reset_index()
-        class_stats['key'] = class_stats.apply(lambda r: (natural_sort_key(r['年级']), natural_sort_key(r[cols_map['class']])), axis=1)
-        chart_df = class_stats.sort_values(by='key')
-        
-        c_cats = json.dumps([str(x) for x in chart_df[cols_map['class']].tolist()], ensure_ascii=False)
-        c_hours = json.dumps(chart_df['课时数'].tolist())
-        c_att = json.dumps([round(x*100, 1) for x in chart_df['出勤率'].tolist()])
-        c_corr = json.dumps([round(x*100, 1) for x in chart_df['题目正确率'].tolist()])
-        
-        best_class = class_stats.sort_values(by=['课时数', '题目正确率'], ascending=False).iloc[0]
-        focus_classes = class_stats[(class_stats['出勤率'] > m_curr['att']) & (class_stats['题目正确率'] < m_curr['corr'])]
-        focus_row = focus_classes.iloc[0] if not focus_classes.empty else None
-
-        best_html = f'<div class="highlight-box success-box">🏆 <strong>综合标杆：{best_class[cols_map["class"]]}</strong> (课时:{int(best_class["课时数"])} / 正确率:{best_class["题目正确率"]*100:.1f}%)</div>'
-        focus_html = ""
-        if focus_row is not None:
-            focus_html = f'<div class="highlight-box warning-box">⚠️ <strong>重点关注：{focus_row[cols_map["class"]]}</strong> (出勤:{focus_row["出勤率"]*100:.1f}% 正常，但正确率 {focus_row["题目正确率"]*100:.1f}% 偏低)</div>'
-        
-        tables_html = ""
-        sorted_grades = sorted(class_stats['年级'].unique(), key=lambda x: natural_sort_key(x))
-        for grade in sorted_grades:
-            g_df = class_stats[class_stats['年级'] == grade].sort_values(by=['课时数', '题目正确率'], ascending=False)
-            tables_html += f"<h3>{grade}</h3><table><thead><tr><th>班级</th><th>主要学科</th><th>课时数</th><th>出勤率</th><th>微课完成率</th><th>题目正确率</th></tr></thead><tbody>"
-            for _, row in g_df.iterrows():
-                att_cls = 'alert' if row['出勤率'] < m_curr['att'] else 'good'
-                corr_cls = 'alert' if row['题目正确率'] < m_curr['corr'] else 'good'
-                tables_html += f"""
-                <tr>
-                    <td><b>{row[cols_map['class']]}</b></td>
-                    <td style="color:#999;font-size:12px;">{row['主要学科']}</td>
-                    <td>{int(row['课时数'])}</td>
-                    <td class="{att_cls}">{row['出勤率']*100:.1f}%</td>
-                    <td>{row['微课完成率']*100:.1f}%</td>
-                    <td class="{corr_cls}">{row['题目正确率']*100:.1f}%</td>
-                </tr>"""
-            tables_html += "</tbody></table>"
-
-        hist_stats = df.groupby(time_col).apply(
-            lambda x: pd.Series({
-                '课时数': int(x[cols_map['hours']].sum()),
-                '出勤率': weighted_avg(x, cols_map['att'], cols_map['hours']),
-                '题目正确率': weighted_avg(x, cols_map['corr'], cols_map['hours'])
-            })
-        ).reset_index()
-        hist_stats['sk'] = hist_stats[time_col].apply(lambda x: natural_sort_key(str(x)))
-        hist_stats = hist_stats.sort_values(by='sk')
-        
-        t_dates = json.dumps([str(x) for x in hist_stats[time_col].tolist()], ensure_ascii=False)
-        t_hours = json.dumps(hist_stats['课时数'].tolist())
-        t_att = json.dumps([round(x*100, 1) for x in hist_stats['出勤率'].tolist()])
-        t_corr = json.dumps([round(x*100, 1) for x in hist_stats['题目正确率'].tolist()])
-
-        # --- HTML 模板 ---
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head><meta charset="UTF-8">
-        <script src="https://cdn.jsdelivr.net/npm/echarts@5.4.3/dist/echarts.min.js"></script>
-        <style>
-            body {{ font-family: "Microsoft YaHei", sans-serif; max-width: 1000px; margin: 0 auto; padding: 20px; background: #f4f6f9; }}
-            .card {{ background: #fff; padding: 20px; margin-bottom: 20px; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.05); }}
-            .kpi {{ display: flex; justify-content: space-around; text-align: center; }}
-            .kpi div strong {{ font-size: 30px; color: #2980b9; display: block; }}
-            .highlight-box {{ padding: 15px; margin: 10px 0; border-radius: 5px; font-size: 14px; }}
-            .success-box {{ background: #d4edda; color: #155724; border-left: 5px solid #28a745; }}
-            .warning-box {{ background: #fff3cd; color: #856404; border-left: 5px solid #ffc107; }}
-            table {{ width: 100%; border-collapse: collapse; margin-top: 10px; font-size: 14px; }}
-            th {{ background: #eee; padding: 10px; border-bottom: 2px solid #ddd; }} 
-            td {{ padding: 10px; border-bottom: 1px solid #eee; text-align: center; }}
-            .alert {{ color: #e74c3c; font-weight: bold; }} .good {{ color: #27ae60; }}
-            .chart {{ height: 400px; width: 100%; }}
-            .footer {{ text-align:center; color:#999; font-size:12px; margin-top:20px; }}
-        </style>
-        </head>
-        <body>
-            <h2 style="text-align:center">AI课堂教学数据分析周报</h2>
-            <div style="text-align:center;color:#666;margin-bottom:20px">
-                统计周期: <b>{target_week}</b> 
-                {f'<span style="font-size:12px">(对比: {prev_week})</span>' if prev_week else ''}
-            </div>
-            
-            <div class="card">
-                <h3>📊 本周核心指标</h3>
-                <div class="kpi">
-                    <div><strong>{m_curr['hours']}{t_h}</strong>总课时</div>
-                    <div><strong>{m_curr['att']*100:.1f}%{t_a}</strong>出勤率</div>
-                    <div><strong>{m_curr['corr']*100:.1f}%{t_c}</strong>正确率</div>
-                </div>
-                {best_html}{focus_html}
-            </div>
-            
-            <div class="card"><h3>🏫 班级效能分析</h3><div id="c1" class="chart"></div></div>
-            <div class="card"><h3>📋 详细数据明细</h3>
-                <p style="text-align:right;color:#999;font-size:12px">* 红色数字表示低于全校均值</p>{tables_html}
-            </div>
-            <div class="card"><h3>📈 全周期历史趋势</h3><div id="c2" class="chart"></div></div>
-            <div class="footer">Generated by AI Agent (Web Edition)</div>
-
-            <script>
-                var c1 = echarts.init(document.getElementById('c1'));
-                c1.setOption({{
-                    tooltip: {{trigger:'axis'}}, legend: {{bottom:0}},
-                    grid: {{left:'3%', right:'4%', bottom:'10%', containLabel:true}},
-                    xAxis: {{type:'category', data:{c_cats}, axisLabel:{{rotate:30, interval:0}}}},
-                    yAxis: [{{type:'value',name:'课时'}}, {{type:'value',name:'%',max:100}}],
-                    series: [
-                        {{type:'bar',name:'课时数',data:{c_hours},itemStyle:{{color:'#3498db'}}}},
-                        {{type:'line',yAxisIndex:1,name:'出勤率',data:{c_att},itemStyle:{{color:'#2ecc71'}}}},
-                        {{type:'line',yAxisIndex:1,name:'正确率',data:{c_corr},itemStyle:{{color:'#e74c3c'}}}}
-                    ]
-                }});
-                var c2 = echarts.init(document.getElementById('c2'));
-                c2.setOption({{
-                    tooltip: {{trigger:'axis'}}, legend: {{bottom:0}},
-                    grid: {{left:'3%', right:'4%', bottom:'10%', containLabel:true}},
-                    xAxis: {{type:'category', data:{t_dates}}},
-                    yAxis: [{{type:'value',name:'课时'}}, {{type:'value',name:'%',max:100}}],
-                    series: [
-                        {{type:'bar',name:'课时数',data:{t_hours},itemStyle:{{color:'#9b59b6'}}}},
-                        {{type:'line',yAxisIndex:1,name:'出勤率',data:{t_att},itemStyle:{{color:'#2ecc71'}}}},
-                        {{type:'line',yAxisIndex:1,name:'正确率',data:{t_corr},itemStyle:{{color:'#e74c3c'}}}}
-                    ]
-                }});
-                window.onresize = function(){{ c1.resize(); c2.resize(); }};
-            </script>
-        </body></html>
-        """
+        if job.state == 'error':
+            # 失败可能是偶发的 (锁冲突、内存不足)：错误只展示这一次，之后的重跑重新计算
+            get_job_manager().discard(job)
+        job.get()
+        bundle = load_cube(files, history_scope)  # 命中缓存；已被淘汰时在此重新计算
+        view = select_view(bundle, history_scope)
+        report = load_report(bundle, history_scope=history_scope, **view)
+        html_content = report['html']
+        names = '、'.join(f.name for f in uploaded_files)
+        st.success(f"✅ 成功读取{len(uploaded_files)}个文件：{names}" if multi else f"✅ 成功读取文件：{names}")
         
         # --- 1. 下载按钮 (放在最上面) ---
-        base_name = os.path.splitext(uploaded_file.name)[0]
         st.download_button(
             label="📥 下载报表 (HTML)",
             data=html_content,
-            file_name=f"{base_name}_分析报表.html",
+            file_name=report_output_path("多校汇总" if multi else uploaded_files[0].name),
             mime="text/html",
             key='download_html_btn'
         )
         
-        # --- 2. 在线预览 (使用 iframe 渲染 HTML) ---
+        # --- 2. 在线预览 (使用 iframe 渲染 HTML；数据量大时为精简版) ---
         st.subheader("👁️ 在线预览")
-        components.html(html_content, height=800, scrolling=True)
+        if report['preview_html'] is not html_content:
+            st.caption("数据量较大，预览中明细表按年级分页、趋势图抽样显示，班级图只显示前若干个班级；下载的报表包含全部数据。")
+        components.html(report['preview_html'], height=800, scrolling=True)
         
         # --- 3. 评价与建议系统 ---
-        st.markdown("---")
-        st.subheader("💬 您的反馈")
-        
-        col_fb1, col_fb2 = st.columns([1, 2])
-        
-        with col_fb1:
-            feedback_score = st.radio("您对本次分析满意吗？", ["👍 棒", "😐 一般", "👎 差"], horizontal=True)
-        
-        with col_fb2:
-            feedback_text = st.text_input("有什么改进建议？(可选)")
-            
-        if st.button("提交评价"):
-            save_feedback(feedback_score, feedback_text)
-            st.success("感谢您的反馈！我们将持续改进。")
-            st.balloons()
+        feedback_form()
         
+    except ReportDataError as e:
+        st.error(str(e))
     except Exception as e:
         st.error(f"发生错误：{str(e)}")
+else:
+    release_report_job()
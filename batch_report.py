@@ -0,0 +1,112 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from report_pipeline import generate_report, report_output_path
+from report_renderer import ECHARTS_LOCAL
+
+# ==========================================
+# 批量生成报表 (命令行，无需 Streamlit)
+# 用法: python batch_report.py 数据目录 [-j 进程数] [-r] [--offline]
+# 每个 CSV/Excel 文件在同目录生成 "<文件名>_分析报表.html"
+# ==========================================
+
+SUPPORTED_EXTS = ('.csv', '.xlsx', '.xls')
+
+
+def find_inputs(directory, recursive=False):
+    """列出目录下待处理的表格文件 (跳过 Excel 临时锁文件)"""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(SUPPORTED_EXTS) and not name.startswith('~$'):
+                paths.append(os.path.join(root, name))
+        if not recursive:
+            break
+    return sorted(paths)
+
+
+def plan_outputs(paths):
+    """确定每个输入的输出路径；同名不同格式 (如 a.csv 与 a.xlsx) 时在文件名中带上扩展名"""
+    stems = {}
+    for path in paths:
+        stem = os.path.splitext(path)[0]
+        stems[stem] = stems.get(stem, 0) + 1
+    outputs = {}
+    for path in paths:
+        stem, ext = os.path.splitext(path)
+        outputs[path] = report_output_path(path) if stems[stem] == 1 else f"{stem}_{ext.lstrip('.')}_分析报表.html"
+    return outputs
+
+
+def process_file(path, output=None, inline_assets=None):
+    """生成单个文件的报表，返回结果记录 (不抛出异常，便于汇总失败原因)"""
+    start = time.perf_counter()
+    output = output or report_output_path(path)
+    try:
+        report = generate_report(path, inline_assets=inline_assets)
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(report['html'])
+        return {'path': path, 'ok': True, 'output': output, 'seconds': time.perf_counter() - start,
+                'week': report['target_week'], 'classes': len(report['class_stats'])}
+    except Exception as e:
+        return {'path': path, 'ok': False, 'error': f"{type(e).__name__}: {e}",
+                'seconds': time.perf_counter() - start}
+
+
+def run_batch(paths, workers=None, on_result=None, inline_assets=None):
+    """多进程并行处理，workers=1 时在当前进程顺序执行"""
+    workers = workers or os.cpu_count() or 1
+    outputs = plan_outputs(paths)
+    results = []
+    if workers == 1 or len(paths) <= 1:
+        for path in paths:
+            results.append(process_file(path, outputs[path], inline_assets))
+            if on_result: on_result(results[-1])
+        return results
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        futures = [pool.submit(process_file, p, outputs[p], inline_assets) for p in paths]
+        for future in as_completed(futures):
+            results.append(future.result())
+            if on_result: on_result(results[-1])
+    return results
+
+
+def print_result(result):
+    name = os.path.basename(result['path'])
+    if result['ok']:
+        print(f"✅ {name}  {result['seconds']:.2f}s  ({result['week']}, {result['classes']} 个班级)")
+    else:
+        print(f"❌ {name}  {result['seconds']:.2f}s  {result['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量生成 AI 课堂周报 (HTML)")
+    parser.add_argument("directory", help="存放 CSV/Excel 文件的目录")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="并行进程数，默认等于 CPU 核数")
+    parser.add_argument("-r", "--recursive", action="store_true", help="同时处理子目录")
+    parser.add_argument("--offline", action="store_true",
+                        help="内嵌本地 assets/echarts.min.js，报表无需联网即可打开")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"目录不存在：{args.directory}")
+    if args.offline and not os.path.exists(ECHARTS_LOCAL):
+        parser.error(f"未找到 {ECHARTS_LOCAL}，请先联网运行 python report_renderer.py --fetch-echarts")
+    paths = find_inputs(args.directory, args.recursive)
+    if not paths:
+        print("未找到 CSV/Excel 文件。")
+        return 0
+
+    start = time.perf_counter()
+    results = run_batch(paths, args.workers, on_result=print_result, inline_assets=True if args.offline else None)
+    failed = [r for r in results if not r['ok']]
+    print(f"\n共 {len(results)} 个文件，成功 {len(results) - len(failed)}，失败 {len(failed)}，"
+          f"总耗时 {time.perf_counter() - start:.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
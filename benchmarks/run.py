@@ -0,0 +1,189 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+from aggregation import finalize_rollups, partial_rollup, rollup_weeks, week_metrics
+from benchmarks.synthetic import SIZES, make_dataset, to_file_bytes
+from cleaning import clear_sort_key_cache, natural_order, natural_sort_key
+from ingest import load_table
+from report_pipeline import normalize_frame
+from report_renderer import render_report_html
+
+# ==========================================
+# 报表流水线基准测试
+# 分阶段计时：读取 / 清洗整理 (normalize_frame) / 自然排序 / 汇总 (class_stats、hist_stats) / 生成 HTML
+# 每个阶段以上一阶段的结果为输入，只计本阶段的耗时
+# 用法 (在仓库根目录):
+#   python -m benchmarks.run                      # 全部预设规模，与基线对比
+#   python -m benchmarks.run --sizes week term    # 只跑部分规模
+#   python -m benchmarks.run --save-baseline      # 把本次结果保存为基线
+# 每个阶段先预热一次，再重复 --repeat 次取中位数，并记录波动 (最慢与最快之差)。
+# 存在基线时，某阶段比基线慢 --threshold 以上、且差值超出两次结果中较大波动的 NOISE_FACTOR 倍，
+# 才判为退化，退出码为 1。
+# ==========================================
+
+STAGES = ['read', 'clean', 'sort', 'aggregate', 'render']
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_REPEAT = 7
+MIN_REPEAT = 3     # 少于 3 次时中位数和波动都不可靠
+BENCH_VERSION = 3  # 阶段划分或计时方式改变时递增，旧基线不再参与对比
+DEFAULT_THRESHOLD = 0.25     # 慢 25% 以上视为退化
+MIN_REGRESSION_SECONDS = 0.005  # 差值小于 5ms 视为计时噪声
+NOISE_FACTOR = 2  # 差值还需超过波动的 2 倍
+
+
+def _timed(fn, repeat):
+    """预热一次后重复执行，返回 (中位数秒数, 波动秒数, 最后一次的返回值)"""
+    result = fn()
+    samples = []
+    for _ in range(max(MIN_REPEAT, repeat)):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples), samples[-1] - samples[0], result
+
+
+def _sort_labels(labels):
+    clear_sort_key_cache()  # 每次都从冷缓存开始
+    return sorted(labels, key=natural_sort_key)
+
+
+def _aggregate(normalized, cols_map):
+    df, week_key, grades = normalized
+    partial = partial_rollup(df, cols_map, grades, week_key)
+    weeks = sorted(rollup_weeks(partial), key=natural_sort_key)
+    target_week = weeks[-1]
+    prev_week = weeks[-2] if len(weeks) > 1 else None
+    hist_stats, class_stats = finalize_rollups(partial, cols_map, target_week)
+    return target_week, prev_week, hist_stats, class_stats
+
+
+def _render(aggregated, cols_map):
+    target_week, prev_week, hist_stats, class_stats = aggregated
+    time_col = cols_map['time']
+    m_curr = week_metrics(hist_stats, time_col, target_week)
+    m_prev = week_metrics(hist_stats, time_col, prev_week)
+    hist_stats = natural_order(hist_stats, [time_col])
+    return render_report_html(target_week, prev_week, m_curr, m_prev, class_stats, hist_stats,
+                              cols_map['class'], time_col)
+
+
+def bench_size(name, params, fmt='csv', repeat=DEFAULT_REPEAT, seed=0):
+    """对一个规模的数据逐阶段计时，返回结果记录"""
+    df = make_dataset(seed=seed, **params)
+    data = to_file_bytes(df, fmt)
+    file_name = f"{name}.{fmt}"
+
+    timings, spread = {}, {}
+    timings['read'], spread['read'], (raw, cols_map) = _timed(lambda: load_table(file_name, data), repeat)
+    timings['clean'], spread['clean'], normalized = _timed(lambda: normalize_frame(raw, cols_map), repeat)
+    labels = normalized[0][cols_map['class']].astype(str).tolist()
+    timings['sort'], spread['sort'], _ = _timed(lambda: _sort_labels(labels), repeat)
+    timings['aggregate'], spread['aggregate'], aggregated = _timed(lambda: _aggregate(normalized, cols_map), repeat)
+    timings['render'], spread['render'], html = _timed(lambda: _render(aggregated, cols_map), repeat)
+    return {
+        'version': BENCH_VERSION,
+        'rows': len(df),
+        'bytes': len(data),
+        'format': fmt,
+        'params': params,
+        'html_bytes': len(html.encode('utf-8')),
+        'seconds': timings,
+        'spread': spread,
+        'total': sum(timings.values()),
+    }
+
+
+def run(sizes, fmt='csv', repeat=DEFAULT_REPEAT, on_result=None):
+    results = {}
+    for name in sizes:
+        key = name if fmt == 'csv' else f"{name}.{fmt}"  # 不同格式分开记录基线
+        results[key] = bench_size(name, SIZES[name], fmt, repeat)
+        if on_result: on_result(key, results[key])
+    return {
+        'meta': {
+            'date': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'machine': platform.platform(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """返回退化列表 [(规模, 阶段, 基线秒数, 当前秒数)]"""
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if (not base or base.get('version') != result['version'] or base.get('format') != result['format']
+                or base.get('params') != result['params']):
+            continue  # 阶段划分或数据规模不同，无法比较
+        for stage in STAGES:
+            old, new = base['seconds'].get(stage), result['seconds'][stage]
+            if old is None:
+                continue
+            noise = max(base['spread'].get(stage, 0), result['spread'][stage]) * NOISE_FACTOR
+            if new > old * (1 + threshold) and new - old > max(MIN_REGRESSION_SECONDS, noise):
+                regressions.append((name, stage, old, new))
+    return regressions
+
+
+def print_result(name, result):
+    cells = "  ".join(f"{stage} {result['seconds'][stage] * 1000:8.1f}ms" for stage in STAGES)
+    print(f"{name:<11} {result['rows']:>8} 行  {cells}  合计 {result['total'] * 1000:8.1f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="报表流水线分阶段基准测试")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES), help="要测试的规模")
+    parser.add_argument("--format", choices=['csv', 'xlsx'], default='csv', help="上传文件格式")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"每个阶段重复次数 (取中位数，至少 {MIN_REPEAT} 次)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="基线文件路径")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="判定退化的相对阈值")
+    parser.add_argument("--output", help="另存本次结果 (JSON)")
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.format, args.repeat, on_result=print_result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        baseline = {'meta': current['meta'], 'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline['results'] = json.load(f).get('results', {})
+        baseline['results'].update(current['results'])
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("\n未找到基线，使用 --save-baseline 保存后即可对比。")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold)
+    if not regressions:
+        print(f"\n✅ 与基线 ({baseline['meta']['date']}) 相比无明显退化")
+        return 0
+    print(f"\n❌ 以下阶段比基线 ({baseline['meta']['date']}) 慢 {args.threshold:.0%} 以上：")
+    for name, stage, old, new in regressions:
+        print(f"  {name} / {stage}: {old * 1000:.1f}ms -> {new * 1000:.1f}ms ({new / old:.2f}x)")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import argparse
+import io
+import sys
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 合成学校数据生成器 (用于基准测试)
+# 表头与平台导出一致：周 / 班级名称 / 学科 / 课时数 / 课时平均出勤率 / 微课完成率 / 题目正确率
+# 百分比列混合 "85.0%" 字符串、0.85 小数和空值，每周末尾带一行 "合计"。
+# 用法: python -m benchmarks.synthetic 输出文件.csv|.xlsx [--weeks 40 --grades 6 ...]
+# ==========================================
+
+GRADE_NAMES = ['七年级', '八年级', '九年级', '高一', '高二', '高三']
+SUBJECT_NAMES = ['语文', '数学', '英语', '物理', '化学', '生物', '历史', '地理', '政治', '信息技术']
+COLUMNS = ['周', '班级名称', '学科', '课时数', '课时平均出勤率', '微课完成率', '题目正确率']
+
+# 预设规模：从单周到多学年
+SIZES = {
+    'week': dict(weeks=1, grades=3, classes=8, subjects=4),
+    'term': dict(weeks=20, grades=6, classes=12, subjects=6),
+    'year': dict(weeks=40, grades=6, classes=12, subjects=6),
+    'multi_year': dict(weeks=160, grades=6, classes=20, subjects=8),
+}
+
+
+def _percent_column(rng, n, low, high, pct_ratio, blank_ratio):
+    """生成一列比率：部分写成 "xx.x%"，部分为小数，少量留空"""
+    values = rng.uniform(low, high, n)
+    out = np.round(values, 3).astype(object)
+    as_pct = rng.random(n) < pct_ratio
+    out[as_pct] = np.char.add(np.char.mod('%.1f', values[as_pct] * 100), '%')
+    out[rng.random(n) < blank_ratio] = ''
+    return out
+
+
+def make_dataset(weeks=12, grades=3, classes=6, subjects=4, pct_ratio=0.5, blank_ratio=0.02,
+                 total_rows=True, seed=0):
+    """生成 周 × 年级 × 班级 × 学科 的明细表，返回 DataFrame"""
+    if not 1 <= grades <= len(GRADE_NAMES):
+        raise ValueError(f"grades 需在 1~{len(GRADE_NAMES)} 之间")
+    if not 1 <= subjects <= len(SUBJECT_NAMES):
+        raise ValueError(f"subjects 需在 1~{len(SUBJECT_NAMES)} 之间")
+    rng = np.random.default_rng(seed)
+
+    class_names = np.array([f"{g}{c}班" for g in GRADE_NAMES[:grades] for c in range(1, classes + 1)])
+    per_week = len(class_names) * subjects
+    n = weeks * per_week
+    week_no = np.repeat(np.arange(1, weeks + 1), per_week)
+    df = pd.DataFrame({
+        '周': np.char.add(np.char.add('第', week_no.astype(str)), '周'),
+        '班级名称': np.tile(np.repeat(class_names, subjects), weeks),
+        '学科': np.tile(np.array(SUBJECT_NAMES[:subjects]), weeks * len(class_names)),
+        '课时数': rng.integers(0, 6, n),
+        '课时平均出勤率': _percent_column(rng, n, 0.7, 1.0, pct_ratio, blank_ratio),
+        '微课完成率': _percent_column(rng, n, 0.0, 1.0, pct_ratio, blank_ratio),
+        '题目正确率': _percent_column(rng, n, 0.4, 1.0, pct_ratio, blank_ratio),
+    }, columns=COLUMNS)
+    if not total_rows:
+        return df
+
+    # 每周末尾插入一行合计 (与平台逐周导出后拼接的文件一致)
+    totals = pd.DataFrame({
+        '周': '合计', '班级名称': '', '学科': '',
+        '课时数': df.groupby(week_no)['课时数'].sum().to_numpy(),
+        '课时平均出勤率': '', '微课完成率': '', '题目正确率': '',
+    }, columns=COLUMNS)
+    order = np.concatenate([week_no.astype(float), np.arange(1, weeks + 1) + 0.5])
+    merged = pd.concat([df, totals], ignore_index=True)
+    return merged.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+
+
+def to_file_bytes(df, fmt='csv'):
+    """序列化为上传文件的字节内容，fmt 为 csv 或 xlsx"""
+    if fmt == 'csv':
+        return df.to_csv(index=False).encode('utf-8')
+    if fmt == 'xlsx':
+        buffer = io.BytesIO()
+        df.to_excel(buffer, index=False)
+        return buffer.getvalue()
+    raise ValueError(f"不支持的格式：{fmt}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成合成的 AI 课堂周报数据")
+    parser.add_argument("output", help="输出文件 (.csv 或 .xlsx)")
+    parser.add_argument("--size", choices=sorted(SIZES), help="使用预设规模 (其余参数可覆盖)")
+    parser.add_argument("--weeks", type=int)
+    parser.add_argument("--grades", type=int)
+    parser.add_argument("--classes", type=int, help="每个年级的班级数")
+    parser.add_argument("--subjects", type=int)
+    parser.add_argument("--pct-ratio", type=float, default=0.5, help="写成 \"%%\" 字符串的比例")
+    parser.add_argument("--no-totals", action="store_true", help="不插入合计行")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    params = dict(SIZES[args.size]) if args.size else {}
+    for name in ('weeks', 'grades', 'classes', 'subjects'):
+        if getattr(args, name) is not None:
+            params[name] = getattr(args, name)
+    df = make_dataset(pct_ratio=args.pct_ratio, total_rows=not args.no_totals, seed=args.seed, **params)
+    fmt = 'xlsx' if args.output.lower().endswith(('.xlsx', '.xls')) else 'csv'
+    with open(args.output, 'wb') as f:
+        f.write(to_file_bytes(df, fmt))
+    print(f"已生成 {args.output}：{len(df)} 行")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
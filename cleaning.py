@@ -0,0 +1,110 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 数据清洗 (向量化实现：百分比解析、年级提取、自然排序)
+# ==========================================
+
+SORT_KEY_CACHE_SIZE = 8192  # 班级/周次标签高度重复，缓存排序键
+GRADE_FALLBACKS = [('七', '七年级'), ('八', '八年级'), ('九', '九年级')]
+_GRADE_TRANS = {'七': '07', '八': '08', '九': '09', '高一': '10', '高二': '11', '高三': '12'}
+_DIGITS_RE = re.compile(r'(\d+)')
+
+
+@lru_cache(maxsize=SORT_KEY_CACHE_SIZE)
+def _cached_sort_key(s):
+    s_temp = s
+    for k, v in _GRADE_TRANS.items():
+        if k in s_temp and ('级' in s_temp or '年' in s_temp):
+            s_temp = s_temp.replace(k, v)
+    return tuple(int(text) if text.isdigit() else text.lower() for text in _DIGITS_RE.split(s_temp))
+
+
+def natural_sort_key(s):
+    """自然排序键 ("七年级2班" < "七年级10班" < "八年级1班")，结果按标签缓存"""
+    if not isinstance(s, str): s = str(s)
+    return _cached_sort_key(s)
+
+
+def clear_sort_key_cache():
+    """清空排序键缓存 (基准测试用，保证每次从冷缓存开始)"""
+    _cached_sort_key.cache_clear()
+
+
+def natural_order(df, cols):
+    """
+    按若干列的自然顺序排序 DataFrame。
+    每列只对去重后的标签计算一次排序键，再转成整数名次交给 sort_values。
+    """
+    ranks = {}
+    for i, col in enumerate(cols):
+        labels = df[col].unique()
+        ordered = sorted(labels, key=natural_sort_key)
+        ranks[f'_rank{i}'] = df[col].map({v: n for n, v in enumerate(ordered)})
+    order = pd.DataFrame(ranks, index=df.index).sort_values(by=list(ranks), kind='stable').index
+    return df.loc[order]
+
+
+def clean_percentage(series):
+    """
+    百分比列向量化清洗：
+    "85%" -> 0.85，"0.85" / 0.85 -> 0.85，空值或无法解析 -> 0.0
+    """
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype(float).fillna(0.0)
+    if isinstance(series.dtype, pd.StringDtype):
+        return _parse_percent_text(series).fillna(0.0).astype(float)
+    # 混合类型列 (Excel 中数值与 "85%" 并存)：数值直接转换，
+    # 只有解析失败的非空单元格 (如 "85%"、" 0.85 ") 才走字符串处理
+    values = pd.to_numeric(series, errors='coerce')
+    todo = values.isna() & series.notna()
+    if todo.any():
+        values = values.astype(float)
+        values[todo] = _parse_percent_text(series[todo].astype(str))
+    return values.fillna(0.0).astype(float)
+
+
+def _parse_percent_text(text):
+    """字符串列 -> 比率："85%" -> 0.85，"0.85" -> 0.85，无法解析 -> NaN"""
+    text = text.str.strip()
+    has_pct = text.str.contains('%', regex=False)
+    values = pd.to_numeric(text.where(~has_pct, text.str.rstrip('%')), errors='coerce')
+    return values.where(~has_pct, values / 100)
+
+
+def to_label_category(series, fill='0'):
+    """
+    文本标签列 (周次/班级/学科) -> category，取值统一为字符串 (与 astype(str) 结果相同)。
+    空值按 fill 处理；只对去重后的取值做字符串转换。
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    labels = pd.Index(uniques).astype(str)
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(labels), codes)
+        labels = labels.append(pd.Index([fill]))
+    # 不同原始值转成字符串后可能相同 (如 1 与 "1")，再去重一次
+    label_codes, categories = pd.factorize(labels)
+    return pd.Series(pd.Categorical.from_codes(label_codes[codes], categories=categories),
+                     index=series.index, name=series.name)
+
+
+def extract_grade(series):
+    """
+    班级名列 -> 年级列 (向量化)；category 列只对各取值计算一次。
+    规则：取班级名中第一个 "级" 及其之前的部分 (如 "七年级3班" -> "七年级")；
+    没有 "级" 时按 GRADE_FALLBACKS 的关键字依次匹配，都不匹配记为 "其他"。
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # 末尾追加 "其他" 给空值 (编码 -1 正好取到最后一个)
+        per_label = np.append(extract_grade(pd.Series(series.cat.categories)).to_numpy(object), '其他')
+        grade_codes, grades = pd.factorize(per_label)
+        return pd.Series(pd.Categorical.from_codes(grade_codes[series.cat.codes.to_numpy()], categories=grades),
+                         index=series.index)
+    text = series.astype(str)
+    grade = text.str.extract(r'(.*?级)', expand=False)
+    conditions = [text.str.contains(key, regex=False) for key, _ in GRADE_FALLBACKS]
+    fallback = np.select(conditions, [g for _, g in GRADE_FALLBACKS], default='其他')
+    return grade.fillna(pd.Series(fallback, index=series.index)).astype(object)
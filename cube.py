@@ -0,0 +1,60 @@
+import numpy as np
+
+from aggregation import GRADE_COL, SOURCE_LEVEL, SUBJECT_LEVEL, WEEK_LEVEL
+from cleaning import natural_sort_key
+
+# ==========================================
+# 汇总立方体
+# 以 (周, 年级, 班级, 学科) 为维度 (多校合并时另有学校维度) 保存课时数与加权乘积之和，
+# 任意年级/学科 (及学校) 组合的报表都从这里切片，不再回扫原始行。
+# ==========================================
+
+
+class RollupCube:
+    """partial_rollup 结果的只读切片视图"""
+
+    def __init__(self, partial):
+        self.data = partial
+        index = partial.index
+        # 各维度的整数编码与取值表，切片时只比较整数
+        self._codes = {}
+        for level in (SOURCE_LEVEL, WEEK_LEVEL, GRADE_COL, SUBJECT_LEVEL):
+            if level not in index.names:
+                continue
+            i = index.names.index(level)
+            self._codes[level] = (np.asarray(index.codes[i]), index.levels[i])
+
+    def _members(self, level):
+        codes, values = self._codes[level]
+        return [values[c] for c in np.unique(codes)]
+
+    def weeks(self):
+        return sorted(self._members(WEEK_LEVEL), key=natural_sort_key)
+
+    def grades(self):
+        return sorted(self._members(GRADE_COL), key=natural_sort_key)
+
+    def subjects(self):
+        return sorted(self._members(SUBJECT_LEVEL), key=natural_sort_key)
+
+    def sources(self):
+        """多校数据中的学校 (按上传顺序)，单校数据为空列表"""
+        if SOURCE_LEVEL not in self._codes:
+            return []
+        codes, values = self._codes[SOURCE_LEVEL]
+        return [values[c] for c in dict.fromkeys(codes.tolist())]
+
+    def _mask(self, level, wanted):
+        codes, values = self._codes[level]
+        positions = values.get_indexer(list(wanted))
+        return np.isin(codes, positions[positions >= 0])
+
+    def select(self, grades=None, subjects=None, sources=None):
+        """按维度取值切片 (保留全部周次)，参数为空表示不筛选；返回与 partial_rollup 同格式的子表"""
+        mask = np.ones(len(self.data), dtype=bool)
+        for level, wanted in ((GRADE_COL, grades), (SUBJECT_LEVEL, subjects), (SOURCE_LEVEL, sources)):
+            if wanted and level in self._codes:
+                mask &= self._mask(level, wanted)
+        if mask.all():
+            return self.data
+        return self.data[mask]
@@ -0,0 +1,198 @@
+import atexit
+import contextlib
+import csv
+import datetime
+import glob
+import os
+import queue
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# ==========================================
+# 缓冲式事件日志
+# 请求线程只把事件放进队列，后台线程按批写入 CSV (持文件锁，避免多进程交错写入)，
+# 支持按大小/按天轮转，进程退出时自动刷盘。
+# ==========================================
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024  # 单个日志文件超过 10MB 时轮转
+FLUSH_INTERVAL = 1.0                  # 后台线程最长 1 秒写一次盘
+MAX_BATCH = 500
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """跨进程文件锁 (使用旁路 .lock 文件)"""
+    with open(path + '.lock', 'a+') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def log_files(path):
+    """某个日志的全部文件：已轮转的历史文件 (按时间先后) + 当前文件"""
+    stem, ext = os.path.splitext(path)
+    files = sorted(glob.glob(f"{glob.escape(stem)}.*{ext}"))
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+class EventLogger:
+    """
+    单个 CSV 日志的写入器：
+    - log() 只入队，不做磁盘 I/O
+    - 后台线程每 FLUSH_INTERVAL 秒或攒够 MAX_BATCH 条写一次
+    - max_bytes: 按大小轮转；rotate_daily: 跨天轮转 (两者可同时启用)
+    """
+
+    def __init__(self, path, columns, max_bytes=DEFAULT_MAX_BYTES, rotate_daily=False,
+                 flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.path = path
+        self.columns = list(columns)
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"event-log:{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    def log(self, row):
+        """记录一条事件 (dict 按列名取值，或按列顺序的 list/tuple)"""
+        if isinstance(row, dict):
+            row = [row.get(c, '') for c in self.columns]
+        if self._closed or not self._thread.is_alive():
+            self._write([list(row)])  # 已关闭 (或写线程意外退出) 时直接写盘，不再入队
+        else:
+            self._queue.put(list(row))
+
+    def flush(self, timeout=5.0):
+        """等待队列中已有的事件全部写盘；写线程已退出时立即返回"""
+        if self._closed:
+            return True
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """刷盘并停止后台线程"""
+        if self._closed:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._closed = True
+
+    def _run(self):
+        while True:
+            batch, markers, stop = [], [], False
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception:
+                    pass  # 任何写盘异常都不能让写线程退出 (否则之后的事件只入队不写盘)，本批事件丢弃
+            for marker in markers:
+                marker.set()
+            if stop:
+                return
+
+    def _rotate_if_needed(self):
+        if not os.path.exists(self.path):
+            return
+        stat = os.stat(self.path)
+        suffix = None
+        if self.rotate_daily:
+            file_day = datetime.date.fromtimestamp(stat.st_mtime)
+            if file_day != datetime.date.today():
+                suffix = file_day.strftime("%Y-%m-%d")
+        if suffix is None and self.max_bytes and stat.st_size >= self.max_bytes:
+            suffix = datetime.datetime.now().strftime("%Y-%m-%d_%H%M%S")
+        if suffix is None:
+            return
+        stem, ext = os.path.splitext(self.path)
+        target = f"{stem}.{suffix}{ext}"
+        n = 1
+        while os.path.exists(target):
+            target = f"{stem}.{suffix}_{n}{ext}"
+            n += 1
+        os.replace(self.path, target)
+
+    def _write(self, rows):
+        with file_lock(self.path):
+            self._rotate_if_needed()
+            is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                if is_new:
+                    writer.writerow(self.columns)
+                writer.writerows(rows)
+
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_logger(path, columns, **kwargs):
+    """进程内按路径共享的日志写入器 (Streamlit 每次重跑都会拿到同一个实例)"""
+    with _loggers_lock:
+        logger = _loggers.get(path)
+        if logger is None:
+            logger = _loggers[path] = EventLogger(path, columns, **kwargs)
+        return logger
+
+
+def _all_loggers():
+    with _loggers_lock:
+        return list(_loggers.values())
+
+
+def flush_all(timeout=5.0):
+    """把所有日志队列中的事件写盘"""
+    for logger in _all_loggers():
+        logger.flush(timeout)
+
+
+def shutdown():
+    """刷盘并停止所有后台线程 (进程退出时自动调用)"""
+    for logger in _all_loggers():
+        logger.close()
+
+
+atexit.register(shutdown)
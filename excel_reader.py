@@ -0,0 +1,152 @@
+import hashlib
+import importlib.util
+import io
+import os
+
+import pandas as pd
+
+from ingest import detect_cols_map, projected_columns
+
+# ==========================================
+# Excel 快速读取
+# - 可插拔引擎：calamine (已安装时) -> openpyxl 只读流式 -> pandas 默认
+# - 只解析用户选中的工作表
+# - 解析结果按内容哈希存为本地 Parquet，同一文件再次生成报表时跳过 Excel 解析
+# ==========================================
+
+EXCEL_CACHE_DIR = os.path.join(".cache", "excel")
+EXCEL_CACHE_MAX_FILES = 200
+
+
+def _has_module(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def list_sheets(data):
+    """列出工作簿中的工作表名 (只读模式，不解析单元格)"""
+    if _has_module('openpyxl'):
+        try:
+            import openpyxl
+            wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True)
+            try: return list(wb.sheetnames)
+            finally: wb.close()
+        except Exception:
+            pass  # 如 .xls 旧格式，交给 pandas 处理
+    return list(pd.ExcelFile(io.BytesIO(data)).sheet_names)
+
+
+def _read_calamine(data, sheet):
+    df = pd.read_excel(io.BytesIO(data), sheet_name=sheet or 0, engine='calamine')
+    cols_map = detect_cols_map(df.columns)
+    return df[projected_columns(cols_map, df.columns)], cols_map
+
+
+def _read_openpyxl_stream(data, sheet):
+    """openpyxl 只读模式逐行读取，只保留报表用到的列"""
+    import openpyxl
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        columns = [str(h) if h is not None else f'Unnamed: {i}' for i, h in enumerate(header)]
+        if not columns:
+            raise ValueError("工作表为空")
+        cols_map = detect_cols_map(columns)
+        keep = [i for i, c in enumerate(columns) if c in set(cols_map.values())]
+        records = []
+        for row in rows:
+            values = [row[i] if i < len(row) else None for i in keep]
+            if any(v is not None for v in values):
+                records.append(values)
+    finally:
+        wb.close()
+    return pd.DataFrame(records, columns=[columns[i] for i in keep]), cols_map
+
+
+def _read_pandas(data, sheet):
+    df = pd.read_excel(io.BytesIO(data), sheet_name=sheet or 0)
+    cols_map = detect_cols_map(df.columns)
+    return df[projected_columns(cols_map, df.columns)], cols_map
+
+
+# 引擎名 -> (是否可用, 读取函数)，按顺序尝试
+ENGINES = {
+    'calamine': (lambda: _has_module('python_calamine'), _read_calamine),
+    'openpyxl-stream': (lambda: _has_module('openpyxl'), _read_openpyxl_stream),
+    'pandas': (lambda: True, _read_pandas),
+}
+
+
+def read_excel_fast(data, sheet=None, engines=None):
+    """按引擎顺序尝试读取，失败自动回退到下一个，返回 (df, cols_map, 实际使用的引擎)"""
+    last_error = None
+    for name in engines or list(ENGINES):
+        available, reader = ENGINES[name]
+        if not available():
+            continue
+        try:
+            df, cols_map = reader(data, sheet)
+            return df.dropna(how='all'), cols_map, name
+        except Exception as e:
+            last_error = e
+    raise last_error or ValueError("没有可用的 Excel 读取引擎")
+
+
+# --- 列式缓存 (Parquet) ---
+def _can_cache():
+    return _has_module('pyarrow')
+
+
+def _cache_path(data, sheet):
+    digest = hashlib.sha256(data).hexdigest()
+    sheet_tag = hashlib.sha256(str(sheet).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(EXCEL_CACHE_DIR, f"{digest}_{sheet_tag}.parquet")
+
+
+def _to_columnar(df):
+    """混合类型的文本列 (如同时有 "85%" 和 0.85) 统一转成字符串，空值保持为空"""
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    for c in df.columns:
+        if df[c].dtype == object:
+            df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+    return df
+
+
+def _prune_cache():
+    files = [os.path.join(EXCEL_CACHE_DIR, f) for f in os.listdir(EXCEL_CACHE_DIR) if f.endswith('.parquet')]
+    if len(files) <= EXCEL_CACHE_MAX_FILES:
+        return
+    files.sort(key=os.path.getmtime)
+    for path in files[:len(files) - EXCEL_CACHE_MAX_FILES]:
+        try: os.remove(path)
+        except OSError: pass
+
+
+def load_excel(data, sheet=None):
+    """
+    读取 Excel 工作表，返回 (df, cols_map)。
+    同一文件同一工作表解析过一次后，直接从本地 Parquet 读取。
+    """
+    path = _cache_path(data, sheet) if _can_cache() else None
+    if path and os.path.exists(path):
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path)
+            return df, detect_cols_map(df.columns)
+        except Exception:
+            pass  # 缓存文件损坏，重新解析
+
+    df, cols_map, _ = read_excel_fast(data, sheet)
+    if path:
+        try:
+            os.makedirs(EXCEL_CACHE_DIR, exist_ok=True)
+            df = _to_columnar(df)
+            tmp_path = path + '.tmp'
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            _prune_cache()
+        except Exception:
+            pass  # 缓存写入失败不影响报表生成
+    return df, cols_map
@@ -0,0 +1,124 @@
+import contextlib
+import datetime
+import sqlite3
+import threading
+
+import pandas as pd
+
+from aggregation import ROLLUP_LEVELS, SUM_COLUMNS, WEEK_LEVEL, weekly_sums
+
+# ==========================================
+# 历史数据库 (SQLite)
+# 按 (历史名称, 周, 年级, 班级, 学科) 保存汇总值，每周上传只需合并新的一周；
+# 同时维护按周汇总的小表，趋势图与周环比直接读取，耗时不随学期数增长。
+# ==========================================
+
+HISTORY_DB = "history.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS class_weeks (
+    scope TEXT NOT NULL,
+    week TEXT NOT NULL,
+    grade TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    hours REAL NOT NULL,
+    p_att REAL NOT NULL,
+    p_micro REAL NOT NULL,
+    p_corr REAL NOT NULL,
+    PRIMARY KEY (scope, week, grade, class_name, subject)
+);
+CREATE TABLE IF NOT EXISTS week_totals (
+    scope TEXT NOT NULL,
+    week TEXT NOT NULL,
+    hours REAL NOT NULL,
+    p_att REAL NOT NULL,
+    p_micro REAL NOT NULL,
+    p_corr REAL NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (scope, week)
+);
+"""
+
+# partial_rollup 列名 <-> 数据库列名
+_DB_LEVELS = ['week', 'grade', 'class_name', 'subject']
+_DB_SUMS = ['hours', 'p_att', 'p_micro', 'p_corr']
+_LEVEL_MAP = dict(zip(ROLLUP_LEVELS, _DB_LEVELS))
+_SUM_MAP = dict(zip(SUM_COLUMNS, _DB_SUMS))
+
+
+class HistoryStore:
+    """按历史名称 (如学校) 隔离的增量历史库，线程安全"""
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_class_weeks_grade ON class_weeks (scope, grade, subject)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """打开连接，正常结束时提交事务，最后关闭连接"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def merge(self, scope, partial):
+        """
+        合并一次上传的最细粒度汇总 (partial_rollup 的结果)。
+        以周为单位去重：上传中出现的周整体替换库中的同名周，其余周保持不变。
+        返回本次写入的周次列表。
+        """
+        fine = partial.reset_index().rename(columns={**_LEVEL_MAP, **_SUM_MAP})
+        fine[['grade', 'class_name', 'subject']] = fine[['grade', 'class_name', 'subject']].astype(str)
+        totals = weekly_sums(partial).rename(columns=_SUM_MAP).rename_axis('week').reset_index()
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        weeks = [(scope, w) for w in totals['week']]
+
+        with self._lock, self._connect() as conn:
+            conn.executemany("DELETE FROM class_weeks WHERE scope = ? AND week = ?", weeks)
+            conn.executemany("DELETE FROM week_totals WHERE scope = ? AND week = ?", weeks)
+            conn.executemany(
+                "INSERT INTO class_weeks (scope, week, grade, class_name, subject, hours, p_att, p_micro, p_corr) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(scope, *row) for row in fine[_DB_LEVELS + _DB_SUMS].itertuples(index=False, name=None)],
+            )
+            conn.executemany(
+                "INSERT INTO week_totals (scope, week, hours, p_att, p_micro, p_corr, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(scope, *row, now) for row in totals[['week'] + _DB_SUMS].itertuples(index=False, name=None)],
+            )
+        return [w for _, w in weeks]
+
+    def week_sums(self, scope, grades=None, subjects=None):
+        """
+        读取按周汇总的结果，格式与 aggregation.weekly_sums 相同。
+        不筛选时直接读周汇总表；按年级/学科筛选时在数据库内 GROUP BY。
+        """
+        if not grades and not subjects:
+            sql = "SELECT week, hours, p_att, p_micro, p_corr FROM week_totals WHERE scope = ?"
+            params = [scope]
+        else:
+            sql = ("SELECT week, SUM(hours) AS hours, SUM(p_att) AS p_att, SUM(p_micro) AS p_micro, "
+                   "SUM(p_corr) AS p_corr FROM class_weeks WHERE scope = ?")
+            params = [scope]
+            for col, values in (('grade', grades), ('subject', subjects)):
+                if values:
+                    sql += f" AND {col} IN ({','.join('?' * len(values))})"
+                    params.extend(values)
+            sql += " GROUP BY week"
+        with self._connect() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        inverse = {v: k for k, v in _SUM_MAP.items()}
+        return df.rename(columns=inverse).set_index('week').rename_axis(WEEK_LEVEL)
+
+    def revision(self, scope):
+        """历史库的版本标记 (最近一次写入时间)，用于报表缓存失效"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(updated_at), COUNT(*) FROM week_totals WHERE scope = ?", (scope,)).fetchone()
+        return f"{row[0]}/{row[1]}"
+
@@ -0,0 +1,122 @@
+import codecs
+import io
+
+import pandas as pd
+
+# ==========================================
+# 数据读取：编码嗅探 + 表头识别 + 按列投影读取
+# ==========================================
+
+SNIFF_BYTES = 64 * 1024                   # 编码嗅探只看文件开头 64KB
+CHUNKED_THRESHOLD_BYTES = 50 * 1024 * 1024  # CSV 超过 50MB 时改为分块读取
+CHUNK_ROWS = 200_000
+FALLBACK_ENCODING = 'gb18030'             # GBK 的超集，兼容 Excel 导出的中文 CSV
+
+# 文本类列统一按字符串读取，数值/百分比列交给解析器推断后再清洗
+LABEL_KEYS = ['time', 'class', 'subject']
+
+
+def is_csv(file_name):
+    return file_name.lower().endswith('.csv')
+
+
+def sniff_encoding(data, sample_size=SNIFF_BYTES):
+    """根据文件开头判断编码：UTF-8 (含 BOM) 或 GB18030"""
+    sample = data[:sample_size]
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # 增量解码，允许样本末尾截断在多字节字符中间
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=len(sample) == len(data))
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+
+
+def detect_cols_map(columns):
+    """根据表头识别各指标所在的列"""
+    columns = list(columns)
+    cols_map = {}
+    if '周' in columns: cols_map['time'] = '周'
+    else: cols_map['time'] = columns[0]
+
+    for c in columns:
+        if '出勤' in c: cols_map['att'] = c
+        elif '正确' in c: cols_map['corr'] = c
+        elif '微课' in c and '率' in c: cols_map['micro'] = c
+        elif '课时' in c and '数' in c: cols_map['hours'] = c
+        elif '班级' in c: cols_map['class'] = c
+        elif '学科' in c: cols_map['subject'] = c
+
+    if 'class' not in cols_map: cols_map['class'] = '班级名称'
+    if 'hours' not in cols_map: cols_map['hours'] = '课时数'
+    if 'att' not in cols_map: cols_map['att'] = '课时平均出勤率'
+    if 'corr' not in cols_map: cols_map['corr'] = '题目正确率'
+    return cols_map
+
+
+def projected_columns(cols_map, columns):
+    """报表实际用到、且表头中存在的列 (保持表头顺序)"""
+    wanted = set(cols_map.values())
+    return [c for c in columns if c in wanted]
+
+
+def column_dtypes(cols_map, columns):
+    """为文本类列指定字符串类型，避免解析器逐列猜测"""
+    return {cols_map[k]: str for k in LABEL_KEYS if k in cols_map and cols_map[k] in columns}
+
+
+def read_csv_header(data, encoding):
+    return list(pd.read_csv(io.BytesIO(data), encoding=encoding, nrows=0).columns)
+
+
+def read_csv_projected(data, encoding, cols_map, columns, **kwargs):
+    return pd.read_csv(
+        io.BytesIO(data),
+        encoding=encoding,
+        usecols=projected_columns(cols_map, columns),
+        dtype=column_dtypes(cols_map, columns),
+        **kwargs,
+    )
+
+
+def _load_csv(data, encoding):
+    columns = read_csv_header(data, encoding)
+    cols_map = detect_cols_map(columns)
+    return read_csv_projected(data, encoding, cols_map, columns), cols_map
+
+
+def load_table(file_name, data, sheet=None):
+    """
+    读取上传文件，返回 (df, cols_map)。
+    CSV：嗅探编码 -> 只读表头识别列 -> 只加载用到的列；
+    Excel：见 excel_reader (流式读取 + Parquet 缓存)，sheet 为空时读第一个工作表。
+    """
+    if is_csv(file_name):
+        encoding = sniff_encoding(data)
+        try:
+            return _load_csv(data, encoding)
+        except UnicodeDecodeError:
+            # 开头是合法 UTF-8，但后面混入了 GBK 字符
+            if encoding == FALLBACK_ENCODING: raise
+            return _load_csv(data, FALLBACK_ENCODING)
+
+    from excel_reader import load_excel  # excel_reader 依赖本模块，延迟导入避免循环
+    return load_excel(data, sheet)
+
+
+def should_stream(file_name, data):
+    """大 CSV 走分块读取，避免一次性占用大量内存"""
+    return is_csv(file_name) and len(data) > CHUNKED_THRESHOLD_BYTES
+
+
+def iter_csv_chunks(data, chunk_rows=CHUNK_ROWS):
+    """
+    分块读取大 CSV，返回 (cols_map, 数据块迭代器)。
+    每块只包含用到的列，可直接交给聚合步骤，无需拼成完整 DataFrame。
+    """
+    encoding = sniff_encoding(data)
+    columns = read_csv_header(data, encoding)
+    cols_map = detect_cols_map(columns)
+    chunks = read_csv_projected(data, encoding, cols_map, columns, chunksize=chunk_rows)
+    return cols_map, chunks
@@ -0,0 +1,142 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ==========================================
+# 后台报表任务
+# 报表计算放到线程池中执行，页面只轮询进度；同一份上传 (按哈希) 只计算一次，
+# 计算期间页面重跑不会重新开始。所有关注者都放弃后 (如换了文件)，任务在下一个阶段边界取消。
+# ==========================================
+
+DEFAULT_WORKERS = 2
+MAX_FINISHED_JOBS = 32  # 已结束任务保留的数量 (任务结果应是小对象，大结果放进报表缓存)
+
+STAGE_LABELS = {'read': '解析文件', 'clean': '清洗数据', 'aggregate': '汇总统计', 'render': '生成报表'}
+STAGE_ORDER = list(STAGE_LABELS)
+
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+
+class Job:
+    """单个后台任务的状态：阶段、进度、结果或异常"""
+
+    def __init__(self, key):
+        self.key = key
+        self.stage = None
+        self.state = 'pending'   # pending / running / done / error / cancelled
+        self.result = None
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self.watchers = set()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    def enter_stage(self, stage):
+        """
+        由计算代码在每个阶段开始时调用：更新进度，已取消时抛出 JobCancelled。
+        分块读取时每块都会依次进入读取/清洗/汇总，进度只前进不回退。
+        """
+        if self._cancel.is_set():
+            raise JobCancelled()
+        if stage in STAGE_ORDER and (self.stage not in STAGE_ORDER
+                                     or STAGE_ORDER.index(stage) > STAGE_ORDER.index(self.stage)):
+            self.stage = stage
+
+    def progress(self):
+        """0~1 的进度 (按已进入的阶段估算)"""
+        if self.state in ('done', 'error'):
+            return 1.0
+        if self.stage not in STAGE_ORDER:
+            return 0.0
+        return STAGE_ORDER.index(self.stage) / len(STAGE_ORDER)
+
+    def stage_label(self):
+        return STAGE_LABELS.get(self.stage, '准备中')
+
+    def cancel(self):
+        self._cancel.set()
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def get(self):
+        """任务结果；计算失败时重新抛出原异常"""
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def _run(self, fn, args, kwargs):
+        self.state = 'running'
+        try:
+            if self._cancel.is_set():
+                raise JobCancelled()
+            self.result = fn(self, *args, **kwargs)
+            self.state = 'done'
+        except JobCancelled as e:
+            self.error, self.state = e.with_traceback(None), 'cancelled'
+        except Exception as e:
+            # 不保留调用栈：栈帧会引用计算中途的数据表
+            self.error, self.state = e.with_traceback(None), 'error'
+        finally:
+            self.finished = time.time()
+            self._done.set()
+
+
+class JobManager:
+    """按键去重的后台任务池，线程安全"""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, watcher=None, **kwargs):
+        """
+        提交任务 fn(job, *args, **kwargs)；同一个键已有未取消的任务时直接返回它。
+        watcher 为关注者标识 (如会话 ID)，用于判断何时可以取消。
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.state == 'cancelled' or (job.cancelled() and not job.done()):
+                job = self._jobs[key] = Job(key)
+                self._pool.submit(job._run, fn, args, kwargs)
+                self._prune()
+            if watcher is not None:
+                job.watchers.add(watcher)
+            return job
+
+    def discard(self, job):
+        """移除已结束的任务 (如失败结果已展示)，下次提交同一个键时重新计算"""
+        with self._lock:
+            if job.done() and self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+
+    def release(self, key, watcher):
+        """关注者不再需要该任务；没有关注者且尚未结束时取消它"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return
+            job.watchers.discard(watcher)
+            if not job.watchers and not job.done():
+                job.cancel()
+
+    def stats(self):
+        """各状态的任务数 (含保留的已结束任务)"""
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {state: states.count(state) for state in set(states)}
+
+    def _prune(self):
+        finished = sorted((job for job in self._jobs.values() if job.done()), key=lambda j: j.finished)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.key]
@@ -0,0 +1,184 @@
+import io
+import os
+import threading
+
+import pandas as pd
+
+from event_log import log_files
+
+# ==========================================
+# 日志查询层
+# 按天记录每条日志在文件中的字节区间，刷新时只读取上次之后追加的部分；
+# 时间范围筛选、分页、按天/按小时计数和下载都直接基于索引，不再整表读取。
+# 约定：日志第一列为 "YYYY-MM-DD HH:MM:SS" 格式的时间，文件按时间顺序追加。
+# ==========================================
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def _in_range(day, start, end):
+    return (not start or day >= start) and (not end or day <= end)
+
+
+def _day_hour(record):
+    """从一条记录的开头取出 (日期, 小时)，时间格式不对时返回 None"""
+    head = record[:13]
+    if len(head) < 13 or head[4:5] != b'-' or head[7:8] != b'-' or not head[11:13].isdigit():
+        return None
+    return head[:10].decode('ascii', 'replace'), int(head[11:13])
+
+
+class _FileIndex:
+    """单个日志文件的索引；轮转只是改名，按 inode 识别后可继续沿用"""
+
+    def __init__(self, ino):
+        self.ino = ino
+        self.offset = 0       # 已索引到的字节位置 (总在完整记录的边界上)
+        self.header = b''
+        self.days = {}        # 日期 -> [起始字节, 结束字节, 条数]
+        self.hours = {}       # (日期, 小时) -> 条数
+
+    def scan(self, path):
+        """索引 offset 之后新追加的完整记录 (末尾写到一半的记录留到下次)"""
+        with open(path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        base, pos, start, quotes = self.offset, 0, 0, 0
+        while True:
+            nl = data.find(b'\n', pos)
+            if nl < 0:
+                break
+            quotes += data.count(b'"', pos, nl)
+            pos = nl + 1
+            if quotes % 2:  # 引号内的换行 (如多行建议)，记录尚未结束
+                continue
+            record = data[start:pos]
+            if base + start == 0:
+                self.header = record
+            else:
+                key = _day_hour(record)
+                if key is not None:
+                    span = self.days.setdefault(key[0], [base + start, base + pos, 0])
+                    span[1] = base + pos
+                    span[2] += 1
+                    self.hours[key] = self.hours.get(key, 0) + 1
+            start, quotes = pos, 0
+        self.offset = base + start
+
+
+class LogIndex:
+    """一个日志 (含已轮转文件) 的按天字节偏移索引，线程安全"""
+
+    def __init__(self, path):
+        self.path = path
+        self._files = {}   # 文件路径 -> _FileIndex，按时间先后排列
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """增量更新索引：已索引的文件只读取新增的尾部"""
+        with self._lock:
+            by_ino = {entry.ino: entry for entry in self._files.values()}
+            files = {}
+            for path in log_files(self.path):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entry = self._files.get(path)
+                if entry is None or entry.ino != stat.st_ino:
+                    entry = by_ino.get(stat.st_ino)
+                if entry is None or stat.st_size < entry.offset:
+                    entry = _FileIndex(stat.st_ino)
+                if stat.st_size > entry.offset:
+                    entry.scan(path)
+                files[path] = entry
+            self._files = files
+
+    def _segments(self, start=None, end=None):
+        """时间范围 [start, end] (含两端日期) 内的 (文件, 起始, 结束, 条数)，按时间先后"""
+        start, end = start and str(start), end and str(end)
+        with self._lock:
+            return [(path, span[0], span[1], span[2])
+                    for path, entry in self._files.items()
+                    for day, span in sorted(entry.days.items())
+                    if _in_range(day, start, end)]
+
+    def days(self):
+        with self._lock:
+            return sorted({day for entry in self._files.values() for day in entry.days})
+
+    def header(self):
+        with self._lock:
+            for entry in reversed(list(self._files.values())):
+                if entry.header:
+                    return entry.header
+        return b''
+
+    def count(self, start=None, end=None):
+        return sum(seg[3] for seg in self._segments(start, end))
+
+    def daily_counts(self, start=None, end=None):
+        """每天的记录条数"""
+        start, end = start and str(start), end and str(end)
+        counts = {}
+        with self._lock:
+            for entry in self._files.values():
+                for day, span in entry.days.items():
+                    if _in_range(day, start, end):
+                        counts[day] = counts.get(day, 0) + span[2]
+        return pd.Series(counts, dtype='int64').sort_index().rename_axis('日期')
+
+    def hourly_counts(self, start=None, end=None):
+        """选定范围内按一天中的小时 (0-23) 汇总的记录条数"""
+        start, end = start and str(start), end and str(end)
+        counts = [0] * 24
+        with self._lock:
+            for entry in self._files.values():
+                for (day, hour), n in entry.hours.items():
+                    if _in_range(day, start, end) and 0 <= hour < 24:
+                        counts[hour] += n
+        return pd.Series(counts, index=pd.RangeIndex(24, name='小时'), dtype='int64')
+
+    def _read_segments(self, segments):
+        header = self.header()
+        if not header:
+            return pd.DataFrame()
+        parts = [header]
+        for path, begin, stop, _ in segments:
+            with open(path, 'rb') as f:
+                f.seek(begin)
+                parts.append(f.read(stop - begin))
+        return pd.read_csv(io.BytesIO(b''.join(parts)), encoding='utf-8-sig', dtype=str, keep_default_na=False)
+
+    def page(self, start=None, end=None, page=0, page_size=DEFAULT_PAGE_SIZE):
+        """按时间倒序的第 page 页 (从 0 开始)，只读取覆盖这一页的字节区间"""
+        segments = self._segments(start, end)
+        total = sum(seg[3] for seg in segments)
+        hi = total - page * page_size
+        lo = max(0, hi - page_size)
+        if hi <= 0:
+            return self._read_segments([]).iloc[0:0]
+        chosen, first_row, row = [], None, 0
+        for seg in segments:
+            if row + seg[3] > lo and row < hi:
+                chosen.append(seg)
+                if first_row is None:
+                    first_row = row
+            row += seg[3]
+        df = self._read_segments(chosen)
+        return df.iloc[lo - first_row:hi - first_row].iloc[::-1].reset_index(drop=True)
+
+    def iter_bytes(self, start=None, end=None, chunk_size=1024 * 1024):
+        """逐块产出时间范围内的原始 CSV 字节 (带表头和 BOM，Excel 可直接打开)"""
+        header = self.header()
+        yield header if header.startswith(b'\xef\xbb\xbf') else b'\xef\xbb\xbf' + header
+        for path, begin, stop, _ in self._segments(start, end):
+            with open(path, 'rb') as f:
+                f.seek(begin)
+                remaining = stop - begin
+                while remaining > 0:
+                    chunk = f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
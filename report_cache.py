@@ -0,0 +1,108 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# ==========================================
+# 报表缓存 (按上传内容哈希 + 列映射做键，按字节预算做 LRU 淘汰)
+# ==========================================
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 默认 256MB
+
+
+def hash_bytes(data):
+    """计算上传文件内容的哈希值"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(file_hash, cols_map):
+    """由文件哈希与列映射组成缓存键 (列映射不同则视为不同报表)"""
+    return (file_hash, tuple(sorted(cols_map.items())))
+
+
+def estimate_size(obj):
+    """粗略估算缓存对象占用的字节数"""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(obj, pd.DataFrame) else int(usage)
+    if isinstance(obj, str):
+        return len(obj.encode('utf-8'))
+    if isinstance(obj, bytes):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(estimate_size(x) for x in obj)
+    return sys.getsizeof(obj)
+
+
+class ReportCache:
+    """
+    线程安全的 LRU 缓存：
+    - 总大小超过 max_bytes 时，从最久未使用的条目开始淘汰
+    - 单个条目超过预算时不缓存
+    - 记录命中/未命中次数 (辅助查找可传 count=False，不计入命中率)
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None, count=True):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += count
+                return self._data[key][0]
+            self.misses += count
+            return default
+
+    def put(self, key, value, size=None):
+        if size is None:
+            size = estimate_size(value)
+        with self._lock:
+            if key in self._data:
+                self.current_bytes -= self._data.pop(key)[1]
+            if size > self.max_bytes:
+                return False
+            self._data[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, old_size) = self._data.popitem(last=False)
+                self.current_bytes -= old_size
+                self.evictions += 1
+            return True
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """返回缓存统计信息，供管理员后台展示"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,241 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from aggregation import (GRADE_COL, NO_SUBJECT, SCHOOL_COL, finalize_rollups, merge_partials, partial_rollup, rollup_weeks,
+                         school_rollups, week_metrics)
+from cleaning import clean_percentage, extract_grade, natural_order, natural_sort_key, to_label_category
+from ingest import iter_csv_chunks, load_table, should_stream
+from metrics import span
+from report_renderer import needs_preview, render_report_html
+
+# ==========================================
+# 报表生成流水线：读取 -> 识别列 -> 清洗 -> 汇总 -> 生成 HTML
+# 不依赖 Streamlit，网页端 (app.py) 与批量生成 (batch_report.py) 共用
+# ==========================================
+
+class ReportDataError(Exception):
+    """上传数据本身有问题 (如缺少有效周次)，直接提示给用户"""
+
+def frame_memory_mb(df):
+    """DataFrame 实际占用的内存 (MB，含字符串对象)"""
+    return float(df.memory_usage(deep=True).sum()) / 1024 / 1024
+
+def normalize_frame(df, cols_map):
+    """
+    把上传数据整理成紧凑的列式表，返回 (df, week_key, grades)：
+    - 只保留报表用到的列；周次/班级/学科转为 category，年级按班级取值只算一次
+    - 课时数为整数时降为最小的整数类型；比率与带小数的课时数保持 float64，
+      float32 的误差会让恰好在 0.05% 边界上的比率四舍五入到另一侧
+    - 周次键只生成一次，合计行用同一个布尔掩码一次性去掉
+    空值的处理与原先的 fillna(0) 一致：标签记为 "0"，数值记为 0。
+    """
+    out = {}
+    for key in ['time', 'class', 'subject']:
+        if key in cols_map and cols_map[key] in df.columns:
+            out[cols_map[key]] = to_label_category(df[cols_map[key]])
+    hours = pd.to_numeric(df[cols_map['hours']], errors='coerce').fillna(0)
+    is_int = hours.dtype.kind in 'iu' or bool((hours == hours.round()).all())
+    out[cols_map['hours']] = pd.to_numeric(hours, downcast='integer') if is_int else hours
+    for k in ['att', 'corr', 'micro']:
+        if k in cols_map and cols_map[k] in df.columns:
+            out[cols_map[k]] = clean_percentage(df[cols_map[k]])
+    df = pd.DataFrame(out, index=df.index)
+
+    week_key = df[cols_map['time']]
+    keep = week_key != '合计'
+    if not keep.all():
+        df = df[keep]
+        week_key = df[cols_map['time']]
+    grades = extract_grade(df[cols_map['class']])
+    return df, week_key, grades
+
+def rollup_frame(df, cols_map, profile=None):
+    """清洗一块数据并做最细粒度汇总，返回 (partial, 清洗后的 df)；有 profile 时记录整理前后的内存占用"""
+    raw_mb = frame_memory_mb(df) if profile is not None else 0
+    with span(profile, 'clean'):
+        df, week_key, grades = normalize_frame(df, cols_map)
+    if profile is not None: profile.add(raw_mb=raw_mb, frame_mb=frame_memory_mb(df))
+    with span(profile, 'aggregate'):
+        partial = partial_rollup(df, cols_map, grades, week_key)
+    return partial, df
+
+def read_and_rollup(file_name, file_bytes, sheet=None, profile=None):
+    """
+    读取上传文件并汇总，返回 (partial, cols_map, df)；大 CSV 分块处理时不保留原始行，df 为 None。
+    profile 为 metrics.RunProfile 时记录各阶段耗时与行数。
+    """
+    if should_stream(file_name, file_bytes):
+        with span(profile, 'read'):
+            cols_map, chunks = iter_csv_chunks(file_bytes)
+            chunks = iter(chunks)
+        parts, rows = [], 0
+        while True:
+            with span(profile, 'read'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            rows += len(chunk)
+            parts.append(rollup_frame(chunk, cols_map, profile)[0])
+        if not parts:
+            raise ReportDataError("数据错误：未找到有效的时间/周次数据。")
+        with span(profile, 'aggregate'):
+            partial = merge_partials(parts)
+        if profile is not None: profile.set(rows=rows)
+        return partial, cols_map, None
+    with span(profile, 'read'):
+        df, cols_map = load_table(file_name, file_bytes, sheet)
+    if profile is not None: profile.set(rows=len(df))
+    partial, df = rollup_frame(df, cols_map, profile)
+    return partial, cols_map, df
+
+# --- 多校合并 ---
+# 各文件表头可能不同，合并前统一改成标准列名 (与平台导出的表头一致)
+MERGED_COLS_MAP = {
+    'time': '周', 'class': '班级名称', 'subject': '学科', 'hours': '课时数',
+    'att': '课时平均出勤率', 'micro': '微课完成率', 'corr': '题目正确率',
+}
+MAX_PARSE_WORKERS = 4
+
+def school_name(file_name):
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+def read_normalized(file_name, file_bytes, sheet=None):
+    """读取单个文件并整理成紧凑表，返回 ([(df, week_key, grades), ...], cols_map)；大 CSV 按块返回多段"""
+    if should_stream(file_name, file_bytes):
+        cols_map, chunks = iter_csv_chunks(file_bytes)
+        return [normalize_frame(chunk, cols_map) for chunk in chunks], cols_map
+    df, cols_map = load_table(file_name, file_bytes, sheet)
+    return [normalize_frame(df, cols_map)], cols_map
+
+def _to_merged_frame(piece, cols_map, school):
+    """把一个文件的整理结果改成标准列名，班级名前加学校名 (各校班级名常常相同)"""
+    df, week_key, grades = piece
+    n = len(df)
+    out = pd.DataFrame(index=pd.RangeIndex(n))
+    out[MERGED_COLS_MAP['time']] = week_key.array
+    out[MERGED_COLS_MAP['class']] = df[cols_map['class']].cat.rename_categories(lambda c: f"{school}·{c}").array
+    if 'subject' in cols_map and cols_map['subject'] in df.columns:
+        out[MERGED_COLS_MAP['subject']] = df[cols_map['subject']].array
+    else:
+        out[MERGED_COLS_MAP['subject']] = pd.Categorical([NO_SUBJECT] * n)
+    out[MERGED_COLS_MAP['hours']] = df[cols_map['hours']].array
+    for key in ['att', 'micro', 'corr']:
+        out[MERGED_COLS_MAP[key]] = df[cols_map[key]].array if cols_map.get(key) in df.columns else 0.0
+    out[GRADE_COL] = grades.array
+    out[SCHOOL_COL] = pd.Categorical([school] * n)
+    return out
+
+def _concat_frames(frames):
+    """纵向拼接，category 列合并取值表后仍保持 category (pd.concat 会退化成 object)"""
+    columns = {}
+    for col in frames[0].columns:
+        parts = [f[col] for f in frames]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            columns[col] = union_categoricals([p.array for p in parts])
+        else:
+            columns[col] = pd.concat(parts, ignore_index=True).to_numpy()
+    return pd.DataFrame(columns)
+
+def read_and_rollup_many(files, profile=None, max_workers=MAX_PARSE_WORKERS):
+    """
+    多个文件 (如各校周报) 合并分析：files 为 [(文件名, 字节, 工作表)]。
+    各文件在线程池中并行读取与整理，列映射分别识别；
+    合并成一张带学校列的表后只做一次汇总。返回 (partial, MERGED_COLS_MAP, 合并后的 df)。
+    """
+    schools, seen = [], {}
+    for name, _, _ in files:
+        school = school_name(name)
+        seen[school] = seen.get(school, 0) + 1
+        schools.append(school if seen[school] == 1 else f"{school}({seen[school]})")
+
+    with span(profile, 'read'):
+        workers = max(1, min(max_workers, len(files)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda f: read_normalized(*f), files))
+    if profile is not None:
+        profile.set(rows=sum(len(piece[0]) for pieces, _ in results for piece in pieces), files=len(files))
+
+    with span(profile, 'clean'):
+        frames = [_to_merged_frame(piece, cols_map, school)
+                  for school, (pieces, cols_map) in zip(schools, results) for piece in pieces]
+        merged = _concat_frames(frames)
+    if merged.empty:
+        raise ReportDataError("数据错误：未找到有效的时间/周次数据。")
+    with span(profile, 'aggregate'):
+        partial = partial_rollup(merged, MERGED_COLS_MAP, merged[GRADE_COL], merged[MERGED_COLS_MAP['time']],
+                                 merged[SCHOOL_COL])
+    return partial, MERGED_COLS_MAP, merged
+
+def report_from_rollup(partial, cols_map, week_sums=None, target_week=None, prev_week=None, filter_label='',
+                       inline_assets=None, profile=None):
+    """
+    由最细粒度汇总结果 (可为立方体切片) 计算指标并生成 HTML 报表。
+    week_sums 来自历史库时，趋势图与对比周使用历史库中的全部周次。
+    target_week 为空时取最新一周，prev_week 为空时取统计周的上一周。
+    inline_assets 见 report_renderer.echarts_tag。
+    返回的 preview_html 为网页内嵌用的精简版 (数据量不大时与 html 相同)。
+    """
+    time_col = cols_map['time']
+    class_col = cols_map['class']
+    all_periods = rollup_weeks(partial)
+    all_periods.sort(key=natural_sort_key)
+    
+    if not all_periods:
+        raise ReportDataError("数据错误：未找到有效的时间/周次数据。")
+
+    if target_week is None:
+        target_week = all_periods[-1]
+    elif target_week not in all_periods:
+        raise ReportDataError(f"所选条件下，{target_week} 没有数据。")
+    if week_sums is not None:
+        all_periods = sorted(week_sums.index, key=natural_sort_key)
+    if prev_week is None:
+        pos = all_periods.index(target_week)
+        prev_week = all_periods[pos - 1] if pos > 0 else None
+    
+    with span(profile, 'aggregate'):
+        hist_stats, class_stats = finalize_rollups(partial, cols_map, target_week, week_sums)
+        m_curr = week_metrics(hist_stats, time_col, target_week)
+        m_prev = week_metrics(hist_stats, time_col, prev_week)
+        school_stats = school_rollups(partial, time_col)
+    if profile is not None: profile.set(classes=len(class_stats))
+    
+    with span(profile, 'render'):
+        hist_stats = natural_order(hist_stats, [time_col])
+        html_content = render_report_html(
+            target_week, prev_week, m_curr, m_prev, class_stats, hist_stats,
+            class_col, time_col, filter_label, inline_assets, school_stats,
+        )
+        preview_html = html_content
+        if needs_preview(class_stats, hist_stats):
+            preview_html = render_report_html(
+                target_week, prev_week, m_curr, m_prev, class_stats, hist_stats,
+                class_col, time_col, filter_label, inline_assets, school_stats, preview=True,
+            )
+
+    return {
+        'target_week': target_week,
+        'prev_week': prev_week,
+        'm_curr': m_curr,
+        'm_prev': m_prev,
+        'class_stats': class_stats,
+        'hist_stats': hist_stats,
+        'school_stats': school_stats,
+        'html': html_content,
+        'preview_html': preview_html,
+    }
+
+def generate_report(path, sheet=None, inline_assets=None):
+    """读取本地文件并生成报表 (批量模式入口)，返回 report 字典"""
+    with open(path, 'rb') as f:
+        file_bytes = f.read()
+    partial, cols_map, _ = read_and_rollup(os.path.basename(path), file_bytes, sheet)
+    return report_from_rollup(partial, cols_map, inline_assets=inline_assets)
+
+def report_output_path(path):
+    """报表输出路径：与输入文件同目录，命名与网页端下载一致"""
+    base_name = os.path.splitext(path)[0]
+    return f"{base_name}_分析报表.html"
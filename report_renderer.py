@@ -0,0 +1,441 @@
+import html
+import json
+import os
+import sys
+import urllib.request
+from functools import lru_cache
+from string import Template
+
+import numpy as np
+import pandas as pd
+
+from cleaning import natural_order, natural_sort_key
+
+# ==========================================
+# HTML 报表渲染
+# - 模板在模块加载时编译一次，渲染只做一次 substitute
+# - 班级明细表按列向量化格式化，整表一次 join，不再 iterrows + 字符串拼接
+# - 图表数据以紧凑 JSON 一次性写入页面
+# - 本地存在 echarts.min.js 时直接内嵌，离线网络也能打开报表
+# - 预览模式 (网页内嵌)：明细表按年级分页、趋势图 LTTB 抽样、班级图只画前 N 个班级；下载的报表仍是全量
+# ==========================================
+
+ECHARTS_CDN = "https://cdn.jsdelivr.net/npm/echarts@5.4.3/dist/echarts.min.js"
+ECHARTS_LOCAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "echarts.min.js")
+
+PREVIEW_PAGE_ROWS = 20     # 预览明细表每页行数
+PREVIEW_TOP_CLASSES = 30   # 预览班级图最多显示的班级数 (按课时数、正确率取前 N)
+PREVIEW_MAX_POINTS = 120   # 预览趋势图最多保留的周次数
+
+_CSS = """
+    body { font-family: "Microsoft YaHei", sans-serif; max-width: 1000px; margin: 0 auto; padding: 20px; background: #f4f6f9; }
+    .card { background: #fff; padding: 20px; margin-bottom: 20px; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.05); }
+    .kpi { display: flex; justify-content: space-around; text-align: center; }
+    .kpi div strong { font-size: 30px; color: #2980b9; display: block; }
+    .highlight-box { padding: 15px; margin: 10px 0; border-radius: 5px; font-size: 14px; }
+    .success-box { background: #d4edda; color: #155724; border-left: 5px solid #28a745; }
+    .warning-box { background: #fff3cd; color: #856404; border-left: 5px solid #ffc107; }
+    table { width: 100%; border-collapse: collapse; margin-top: 10px; font-size: 14px; }
+    th { background: #eee; padding: 10px; border-bottom: 2px solid #ddd; }
+    td { padding: 10px; border-bottom: 1px solid #eee; text-align: center; }
+    .alert { color: #e74c3c; font-weight: bold; } .good { color: #27ae60; }
+    .chart { height: 400px; width: 100%; }
+    .footer { text-align:center; color:#999; font-size:12px; margin-top:20px; }
+"""
+
+_PREVIEW_CSS = """
+    .note { font-size:12px; color:#999; font-weight:normal; }
+    .tabs button, .pager button { border:1px solid #ddd; background:#fff; padding:4px 12px; margin:2px; border-radius:4px; cursor:pointer; }
+    .tabs button.on { background:#2980b9; color:#fff; border-color:#2980b9; }
+    .pager { text-align:center; margin-top:10px; font-size:13px; color:#666; }
+"""
+
+CHART_TEMPLATE = Template("""
+var D = $payload;
+function chartOption(d, barColor, rotate) {
+    return {
+        tooltip: {trigger:'axis'}, legend: {bottom:0},
+        grid: {left:'3%', right:'4%', bottom:'10%', containLabel:true},
+        xAxis: rotate ? {type:'category', data:d.cats, axisLabel:{rotate:30, interval:0}} : {type:'category', data:d.cats},
+        yAxis: [{type:'value',name:'课时'}, {type:'value',name:'%',max:100}],
+        series: [
+            {type:'bar',name:'课时数',data:d.hours,itemStyle:{color:barColor}},
+            {type:'line',yAxisIndex:1,name:'出勤率',data:d.att,itemStyle:{color:'#2ecc71'}},
+            {type:'line',yAxisIndex:1,name:'正确率',data:d.corr,itemStyle:{color:'#e74c3c'}}
+        ]
+    };
+}
+var c1 = echarts.init(document.getElementById('c1'));
+c1.setOption(chartOption(D.c1, '#3498db', true));
+var c2 = echarts.init(document.getElementById('c2'));
+c2.setOption(chartOption(D.c2, '#9b59b6', false));
+window.onresize = function(){ c1.resize(); c2.resize(); };
+""")
+
+# 多校对比图：每校一条出勤率实线、一条正确率虚线，缺少的周次留空
+SCHOOL_CHART_TEMPLATE = Template("""
+var S = $payload;
+var series = [];
+S.schools.forEach(function(s){
+    series.push({type:'line',name:s.name+' 出勤率',data:s.att,connectNulls:true});
+    series.push({type:'line',name:s.name+' 正确率',data:s.corr,connectNulls:true,lineStyle:{type:'dashed'}});
+});
+var c3 = echarts.init(document.getElementById('c3'));
+c3.setOption({
+    tooltip: {trigger:'axis'}, legend: {bottom:0, type:'scroll'},
+    grid: {left:'3%', right:'4%', bottom:'12%', containLabel:true},
+    xAxis: {type:'category', data:S.cats}, yAxis: {type:'value', name:'%', max:100},
+    series: series
+});
+window.addEventListener('resize', function(){ c3.resize(); });
+""")
+
+# 预览明细表：各年级的行 HTML 放在 T 中，只把当前年级的当前页写入表格
+TABLE_PAGER_TEMPLATE = Template("""
+var T = $payload, grade = 0, page = 0;
+function showPage() {
+    var rows = T.grades[grade].rows, pages = Math.max(1, Math.ceil(rows.length / T.size));
+    page = Math.min(Math.max(page, 0), pages - 1);
+    document.getElementById('rows').innerHTML = rows.slice(page * T.size, (page + 1) * T.size).join('');
+    document.getElementById('page-info').textContent = '第 ' + (page + 1) + ' / ' + pages + ' 页，共 ' + rows.length + ' 个班级';
+    document.querySelectorAll('.tabs button').forEach(function(b, i){ b.className = i === grade ? 'on' : ''; });
+}
+function showGrade(i) { grade = i; page = 0; showPage(); }
+function turnPage(step) { page += step; showPage(); }
+showPage();
+""")
+
+PAGE_TEMPLATE = Template("""<!DOCTYPE html>
+<html>
+<head><meta charset="UTF-8">
+$echarts
+<style>$css</style>
+</head>
+<body>
+    <h2 style="text-align:center">AI课堂教学数据分析周报</h2>
+    <div style="text-align:center;color:#666;margin-bottom:20px">
+        统计周期: <b>$target_week</b> $compare $filters
+    </div>
+    <div class="card">
+        <h3>📊 本周核心指标</h3>
+        <div class="kpi">
+            <div><strong>$hours$t_h</strong>总课时</div>
+            <div><strong>$att$t_a</strong>出勤率</div>
+            <div><strong>$corr$t_c</strong>正确率</div>
+        </div>
+        $highlights
+    </div>
+    <div class="card"><h3>🏫 班级效能分析$c1_note</h3><div id="c1" class="chart"></div></div>
+    <div class="card"><h3>📋 详细数据明细</h3>
+        <p style="text-align:right;color:#999;font-size:12px">* 红色数字表示低于全校均值</p>$tables
+    </div>
+    <div class="card"><h3>📈 全周期历史趋势$c2_note</h3><div id="c2" class="chart"></div></div>$schools
+    <div class="footer">Generated by AI Agent (Web Edition)</div>
+    <script>$chart_js</script>
+</body></html>
+""")
+
+_TABLE_HEAD = ("<table><thead><tr><th>班级</th><th>主要学科</th><th>课时数</th><th>出勤率</th>"
+               "<th>微课完成率</th><th>题目正确率</th></tr></thead><tbody>")
+_TABLE_TAIL = "</tbody></table>"
+_PAGED_TABLE_HEAD = _TABLE_HEAD.replace("<tbody>", '<tbody id="rows">')
+
+
+def get_trend_html(current, previous, is_percent=False):
+    if previous is None or previous == 0: return ""
+    diff = current - previous
+    if abs(diff) < 0.0001: return '<span style="color:#999;font-size:14px;">(持平)</span>'
+    symbol = "↑" if diff > 0 else "↓"
+    color = "#2ecc71" if diff > 0 else "#e74c3c"
+    diff_str = f"{abs(diff)*100:.1f}%" if is_percent else f"{int(abs(diff))}"
+    return f'<span style="color:{color};font-weight:bold;">{symbol} {diff_str}</span>'
+
+
+# --- 静态资源 ---
+@lru_cache(maxsize=1)
+def _read_local_echarts(path, mtime):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().replace('</script', '<\\/script')
+
+
+def echarts_tag(inline=None):
+    """
+    ECharts 引用方式：
+    inline=None  本地有 echarts.min.js 时内嵌，否则用 CDN
+    inline=True  必须内嵌 (本地文件缺失时报错)
+    inline=False 始终用 CDN
+    """
+    has_local = os.path.exists(ECHARTS_LOCAL)
+    if inline is None:
+        inline = has_local
+    if not inline:
+        return f'<script src="{ECHARTS_CDN}"></script>'
+    if not has_local:
+        raise FileNotFoundError(f"未找到本地 ECharts：{ECHARTS_LOCAL}，请先运行 python report_renderer.py --fetch-echarts")
+    return f"<script>{_read_local_echarts(ECHARTS_LOCAL, os.path.getmtime(ECHARTS_LOCAL))}</script>"
+
+
+def fetch_echarts(dest=ECHARTS_LOCAL, url=ECHARTS_CDN):
+    """联网时下载一次 echarts.min.js 到本地，之后生成的报表均可离线打开"""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp_path = dest + '.tmp'
+    with urllib.request.urlopen(url, timeout=30) as resp, open(tmp_path, 'wb') as f:
+        f.write(resp.read())
+    os.replace(tmp_path, dest)
+    return dest
+
+
+# --- 向量化片段 ---
+def _pct_text(values):
+    return pd.Series(np.char.mod('%.1f%%', np.asarray(values, dtype=float) * 100), dtype=object)
+
+
+def _escape(values):
+    text = pd.Series(values.astype(str).to_numpy(), dtype=object).str
+    return text.replace('&', '&amp;', regex=False).str.replace('<', '&lt;', regex=False).str.replace('>', '&gt;', regex=False)
+
+
+def _pct_list(values):
+    return np.round(np.asarray(values, dtype=float) * 100, 1).tolist()
+
+
+def _json(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+
+
+def _table_rows(class_stats, class_col, m_curr):
+    """格式化全部明细行，返回 [(年级, 该年级的行 HTML 数组)]"""
+    grade_order = {g: i for i, g in enumerate(sorted(class_stats['年级'].unique(), key=natural_sort_key))}
+    df = class_stats.assign(_g=class_stats['年级'].map(grade_order))
+    df = df.sort_values(by=['_g', '课时数', '题目正确率'], ascending=[True, False, False], kind='stable')
+
+    att = df['出勤率'].to_numpy(dtype=float)
+    corr = df['题目正确率'].to_numpy(dtype=float)
+    att_cls = pd.Series(np.where(att < m_curr['att'], 'alert', 'good'), dtype=object)
+    corr_cls = pd.Series(np.where(corr < m_curr['corr'], 'alert', 'good'), dtype=object)
+    rows = ('<tr><td><b>' + _escape(df[class_col]) + '</b></td>'
+            + '<td style="color:#999;font-size:12px;">' + _escape(df['主要学科']) + '</td>'
+            + '<td>' + pd.Series(df['课时数'].astype(int).astype(str).to_numpy(), dtype=object) + '</td>'
+            + '<td class="' + att_cls + '">' + _pct_text(att) + '</td>'
+            + '<td>' + _pct_text(df['微课完成率']) + '</td>'
+            + '<td class="' + corr_cls + '">' + _pct_text(corr) + '</td></tr>').to_numpy()
+
+    grade_codes = df['_g'].to_numpy()
+    bounds = np.flatnonzero(np.diff(grade_codes)) + 1
+    return [(html.escape(str(df['年级'].iat[start]), quote=False), rows[start:end])
+            for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(rows)])]
+
+
+def render_tables(class_stats, class_col, m_curr):
+    """按年级生成班级明细表：整表一次性格式化所有行，再按年级切分拼接"""
+    if class_stats.empty:
+        return ""
+    return ''.join(f"<h3>{grade}</h3>{_TABLE_HEAD}{''.join(rows)}{_TABLE_TAIL}"
+                   for grade, rows in _table_rows(class_stats, class_col, m_curr))
+
+
+def render_paged_tables(class_stats, class_col, m_curr, page_rows=PREVIEW_PAGE_ROWS):
+    """
+    预览用明细表：年级切换 + 分页，页面中只有当前一页的行。
+    返回 (HTML 片段, 分页脚本数据)，无数据时返回 ("", None)。
+    """
+    if class_stats.empty:
+        return "", None
+    groups = _table_rows(class_stats, class_col, m_curr)
+    tabs = ''.join(f'<button onclick="showGrade({i})">{grade}</button>' for i, (grade, _) in enumerate(groups))
+    section = (f'<div class="tabs">{tabs}</div>{_PAGED_TABLE_HEAD}{_TABLE_TAIL}'
+               '<div class="pager"><button onclick="turnPage(-1)">上一页</button> '
+               '<span id="page-info"></span> <button onclick="turnPage(1)">下一页</button></div>')
+    payload = {'size': page_rows, 'grades': [{'name': grade, 'rows': rows.tolist()} for grade, rows in groups]}
+    return section, payload
+
+
+def render_highlights(class_stats, class_col, m_curr):
+    """综合标杆 / 重点关注 提示框"""
+    best_class = class_stats.sort_values(by=['课时数', '题目正确率'], ascending=False).iloc[0]
+    focus_classes = class_stats[(class_stats['出勤率'] > m_curr['att']) & (class_stats['题目正确率'] < m_curr['corr'])]
+    focus_row = focus_classes.iloc[0] if not focus_classes.empty else None
+
+    best_name = html.escape(str(best_class[class_col]), quote=False)
+    out = f'<div class="highlight-box success-box">🏆 <strong>综合标杆：{best_name}</strong> (课时:{int(best_class["课时数"])} / 正确率:{best_class["题目正确率"]*100:.1f}%)</div>'
+    if focus_row is not None:
+        focus_name = html.escape(str(focus_row[class_col]), quote=False)
+        out += f'<div class="highlight-box warning-box">⚠️ <strong>重点关注：{focus_name}</strong> (出勤:{focus_row["出勤率"]*100:.1f}% 正常，但正确率 {focus_row["题目正确率"]*100:.1f}% 偏低)</div>'
+    return out
+
+
+def lttb_indices(values, threshold):
+    """
+    Largest-Triangle-Three-Buckets 抽样：保留首尾点，其余每个桶选出与前后点构成三角形面积最大的一点，
+    点数减少后仍保留峰谷形状。返回保留点的位置 (升序)。
+    """
+    y = np.nan_to_num(np.asarray(values, dtype=float))
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    picked = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = (end + next_end - 1) / 2 if next_end > end else n - 1
+        avg_y = y[end:next_end].mean() if next_end > end else y[-1]
+        xs = np.arange(start, end)
+        area = np.abs((a - avg_x) * (y[start:end] - y[a]) - (a - xs) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        picked.append(a)
+    picked.append(n - 1)
+    return np.array(picked)
+
+
+def downsample_trend(hist_stats, max_points=PREVIEW_MAX_POINTS):
+    """趋势数据抽样到 max_points 周以内：课时数、出勤率、正确率各做一次 LTTB，取保留周次的并集"""
+    if len(hist_stats) <= max_points:
+        return hist_stats
+    per_series = max(3, max_points // 3)
+    keep = np.unique(np.concatenate([lttb_indices(hist_stats[col], per_series)
+                                     for col in ('课时数', '出勤率', '题目正确率')]))
+    return hist_stats.iloc[keep]
+
+
+def top_classes(class_stats, n=PREVIEW_TOP_CLASSES):
+    """课时数 (其次正确率) 最高的 n 个班级"""
+    if len(class_stats) <= n:
+        return class_stats
+    return class_stats.sort_values(by=['课时数', '题目正确率'], ascending=False, kind='stable').head(n)
+
+
+def needs_preview(class_stats, hist_stats):
+    """数据量超过预览上限时才需要单独生成预览版"""
+    largest_grade = class_stats['年级'].value_counts().max() if not class_stats.empty else 0
+    return (len(class_stats) > PREVIEW_TOP_CLASSES or len(hist_stats) > PREVIEW_MAX_POINTS
+            or largest_grade > PREVIEW_PAGE_ROWS)
+
+
+def chart_payload(class_stats, hist_stats, class_col, time_col):
+    """两张图表的数据：班级效能 (c1) 与历史趋势 (c2，hist_stats 需已按周次排序)"""
+    chart_df = natural_order(class_stats, ['年级', class_col])
+    hist_df = hist_stats
+    return {
+        'c1': {
+            'cats': [str(x) for x in chart_df[class_col].tolist()],
+            'hours': chart_df['课时数'].astype(int).tolist(),
+            'att': _pct_list(chart_df['出勤率']),
+            'corr': _pct_list(chart_df['题目正确率']),
+        },
+        'c2': {
+            'cats': [str(x) for x in hist_df[time_col].tolist()],
+            'hours': hist_df['课时数'].astype(int).tolist(),
+            'att': _pct_list(hist_df['出勤率']),
+            'corr': _pct_list(hist_df['题目正确率']),
+        },
+    }
+
+
+def render_schools(school_stats, time_col, target_week, prev_week, m_curr):
+    """
+    多校对比：统计周各校核心指标表 (含与对比周的变化) 与各校趋势图数据。
+    返回 (HTML 片段, 图表数据)。
+    """
+    order = list(dict.fromkeys(school_stats['学校']))
+    by_week = {w: g.set_index('学校') for w, g in school_stats.groupby(time_col, sort=False)}
+    curr = by_week.get(target_week, pd.DataFrame()).reindex(order)
+    prev = by_week.get(prev_week, pd.DataFrame()).reindex(order) if prev_week is not None else None
+
+    rows = []
+    for school in order:
+        name = html.escape(str(school), quote=False)
+        row = curr.loc[school]
+        if pd.isna(row.get('课时数')):
+            rows.append(f'<tr><td><b>{name}</b></td><td colspan="3" style="color:#999">本周无数据</td></tr>')
+            continue
+        p = prev.loc[school] if prev is not None else None
+        has_prev = p is not None and not pd.isna(p.get('课时数'))
+        cells = []
+        for col, is_pct in (('课时数', False), ('出勤率', True), ('题目正确率', True)):
+            value = row[col]
+            text = f"{value*100:.1f}%" if is_pct else f"{int(value)}"
+            trend = get_trend_html(value, p[col], is_pct) if has_prev else ""
+            css = ''
+            if col == '出勤率': css = ' class="alert"' if value < m_curr['att'] else ' class="good"'
+            if col == '题目正确率': css = ' class="alert"' if value < m_curr['corr'] else ' class="good"'
+            cells.append(f'<td{css}>{text} {trend}</td>')
+        rows.append(f'<tr><td><b>{name}</b></td>{"".join(cells)}</tr>')
+
+    compare = f" (对比 {html.escape(str(prev_week), quote=False)})" if prev_week is not None else ""
+    section = (
+        '\n    <div class="card"><h3>🏫 学校对比</h3>'
+        f'<p style="text-align:right;color:#999;font-size:12px">* {html.escape(str(target_week), quote=False)}{compare}，'
+        '红色数字表示低于全体均值</p>'
+        '<table><thead><tr><th>学校</th><th>课时数</th><th>出勤率</th><th>题目正确率</th></tr></thead>'
+        f'<tbody>{"".join(rows)}</tbody></table>'
+        '<h3>📈 各校趋势</h3><div id="c3" class="chart"></div></div>'
+    )
+
+    weeks = sorted(by_week, key=natural_sort_key)
+    payload = {'cats': [str(w) for w in weeks], 'schools': []}
+    for school in order:
+        trend = school_stats[school_stats['学校'] == school].set_index(time_col).reindex(weeks)
+        payload['schools'].append({
+            'name': str(school),
+            'att': [None if pd.isna(v) else round(v * 100, 1) for v in trend['出勤率']],
+            'corr': [None if pd.isna(v) else round(v * 100, 1) for v in trend['题目正确率']],
+        })
+    return section, payload
+
+
+def render_report_html(target_week, prev_week, m_curr, m_prev, class_stats, hist_stats,
+                       class_col, time_col, filter_label='', inline_assets=None, school_stats=None, preview=False):
+    """
+    生成完整的 HTML 报表；school_stats (aggregation.school_rollups) 不为空时增加学校对比部分。
+    preview=True 生成网页内嵌用的精简版 (明细分页、趋势抽样、班级图取前 N 个)，指标与提示框不变。
+    """
+    t_h = t_a = t_c = ""
+    if m_prev:
+        t_h = get_trend_html(m_curr['hours'], m_prev['hours'], False)
+        t_a = get_trend_html(m_curr['att'], m_prev['att'], True)
+        t_c = get_trend_html(m_curr['corr'], m_prev['corr'], True)
+
+    css, c1_note, c2_note = _CSS, '', ''
+    if preview:
+        chart_classes, chart_hist = top_classes(class_stats), downsample_trend(hist_stats)
+        if len(chart_classes) < len(class_stats):
+            c1_note = f' <span class="note">(预览仅显示课时数前 {len(chart_classes)} 个班级，下载的报表含全部)</span>'
+        if len(chart_hist) < len(hist_stats):
+            c2_note = f' <span class="note">(预览抽样显示 {len(chart_hist)} / {len(hist_stats)} 周，下载的报表含全部)</span>'
+        payload = chart_payload(chart_classes, chart_hist, class_col, time_col)
+        tables, table_payload = render_paged_tables(class_stats, class_col, m_curr)
+        css += _PREVIEW_CSS
+    else:
+        payload = chart_payload(class_stats, hist_stats, class_col, time_col)
+        tables, table_payload = render_tables(class_stats, class_col, m_curr), None
+    chart_js = CHART_TEMPLATE.substitute(payload=_json(payload))
+    if table_payload is not None:
+        chart_js += TABLE_PAGER_TEMPLATE.substitute(payload=_json(table_payload))
+    schools = ""
+    if school_stats is not None and not school_stats.empty:
+        schools, school_payload = render_schools(school_stats, time_col, target_week, prev_week, m_curr)
+        chart_js += SCHOOL_CHART_TEMPLATE.substitute(payload=_json(school_payload))
+    return PAGE_TEMPLATE.substitute(
+        echarts=echarts_tag(inline_assets),
+        css=css,
+        target_week=html.escape(str(target_week), quote=False),
+        compare=f'<span style="font-size:12px">(对比: {html.escape(str(prev_week), quote=False)})</span>' if prev_week else '',
+        filters=f'<div style="font-size:12px">筛选: {html.escape(filter_label, quote=False)}</div>' if filter_label else '',
+        hours=m_curr['hours'], t_h=t_h,
+        att=f"{m_curr['att']*100:.1f}%", t_a=t_a,
+        corr=f"{m_curr['corr']*100:.1f}%", t_c=t_c,
+        highlights=render_highlights(class_stats, class_col, m_curr),
+        tables=tables,
+        schools=schools,
+        c1_note=c1_note, c2_note=c2_note,
+        chart_js=chart_js,
+    )
+
+
+if __name__ == "__main__":
+    if "--fetch-echarts" in sys.argv:
+        print(f"已下载到 {fetch_echarts()}")
+    else:
+        print("用法: python report_renderer.py --fetch-echarts")